@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description: compare requests.request with the pooled http client against a local stub server
+
+usage: python3 http_client_benchmark.py [--requests 2000] [--threads 8]
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from vulcanus.restful.client import HttpClient
+
+RESPONSE_BODY = json.dumps({"code": "200", "label": "Succeed", "message": "operation succeed", "data": {}}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answer every request with a fixed json body and keep the connection alive
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(send, url, total, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for response in executor.map(lambda _: send("GET", url, timeout=10), range(total)):
+            response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="http client benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%s/stub" % server.server_address[1]
+
+    client = HttpClient(pool_maxsize=args.threads)
+    for name, send in (("requests.request", requests.request), ("HttpClient", client.request)):
+        elapsed = run(send, url, args.requests, args.threads)
+        print(
+            "%-18s %6d requests in %.3fs, %8.1f req/s, %.3f ms/request"
+            % (name, args.requests, elapsed, args.requests / elapsed, elapsed * 1000 / args.requests)
+        )
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -16,13 +16,16 @@ from vulcanus.log.log import LOGGER
 from vulcanus.manage import init_application
 from vulcanus.restful.serialize import validate
 from vulcanus.rsa import (
+    canonical_bytes,
     generate_rsa_key_pair,
     get_private_key_pem_str,
     get_public_key_pem_str,
+    load_cached_public_key,
     load_private_key,
     load_public_key,
     sign_data,
     verify_signature,
+    verify_signature_with_pem,
 )
 from vulcanus.send_email import Email
 from vulcanus.timed import TimedTask, TimedTaskManager
@@ -46,4 +49,7 @@ __all__ = (
     "get_public_key_pem_str",
     "load_private_key",
     "load_public_key",
+    "load_cached_public_key",
+    "verify_signature_with_pem",
+    "canonical_bytes",
 )
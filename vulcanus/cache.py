@@ -10,12 +10,21 @@
 # PURPOSE.
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
+import hashlib
 import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import wraps
 from typing import Optional
 
-from flask import g
+from flask import g, has_app_context
 from redis.client import Redis
 from redis.exceptions import RedisError
+from vulcanus.conf import configuration
 from vulcanus.conf.constant import (
     ALL_HOST_GROUP_MAP,
     CLUSTER_GROUP_CACHE,
@@ -25,10 +34,160 @@ from vulcanus.conf.constant import (
     LOCAL_CLUSTER_INFO,
 )
 from vulcanus.database.proxy import RedisProxy
+from vulcanus.local_cache import InvalidationListener, LocalCache
 from vulcanus.log.log import LOGGER
 from vulcanus.restful.resp import state
 from vulcanus.restful.response import BaseResponse
 
+CACHE_INVALIDATE_CHANNEL = "cache-invalidate"
+
+
+def request_cached(func):
+    """
+    Memoize the decoded value of a cache item in flask.g, so it's read from redis once per request
+    """
+
+    @wraps(func)
+    def wrapper(self):
+        memo = self.request_memo
+        if memo is None:
+            return func(self)
+        memo_key = self.memo_key(func.__name__)
+        if memo_key not in memo:
+            memo[memo_key] = func(self)
+        return memo[memo_key]
+
+    return wrapper
+
+
+def local_cached(func):
+    """
+    Serve a cache item shared by all the users from the process-local cache before reading redis
+    """
+
+    @wraps(func)
+    def wrapper(self):
+        key_attr, _, _ = self.CACHE_ITEMS[func.__name__]
+        key = getattr(self, key_attr)
+        value = shared_item_cache.get(key)
+        if value is None:
+            value = func(self)
+            if value:
+                shared_item_cache.set(key, value, self.client)
+        return value
+
+    return wrapper
+
+
+def jitter(ttl: int) -> int:
+    """
+    Add up to 20% random seconds to ttl, so the keys written at the same time don't expire at the same time
+    """
+    return ttl + random.randint(0, max(ttl // 5, 1))
+
+
+class SingleFlight:
+    """
+    Run a function once among the threads calling it with the same key at the same time,
+    the other threads wait for the result of the running one
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = dict()
+
+    def do(self, key, func, wait=True, timeout=None):
+        """
+        Args:
+            key (str): calls with the same key are merged
+            func (callable): function without arguments
+            wait (bool): wait for the running call, or return None at once when there is one
+            timeout (float): seconds to wait for the running call, None is returned when it's timeout
+
+        Returns:
+            result of func
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            if not wait:
+                return None
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                return None
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class SharedItemCache:
+    """
+    Process-local cache in front of redis for the cache items shared by all the users, e.g clusters.
+    An entry lives for a few seconds at most, and it's dropped as soon as the redis key is written,
+    deleted or expired, which is notified by the keyspace events of redis or by publish_cache_invalidation.
+    The cached values are shared by the threads and must not be modified.
+    """
+
+    def __init__(self, keys, maxsize=None, ttl=None):
+        """
+        Args:
+            keys(tuple): redis keys that can be cached
+            maxsize(int): maximum number of cached keys
+            ttl(int): seconds that a value is cached, 0 disables the cache
+        """
+        cache_config = configuration.local_cache
+        if ttl is None:
+            ttl = getattr(cache_config, "ttl", None)
+        self.ttl = 10 if ttl is None else ttl
+        self._cache = LocalCache(maxsize=maxsize or getattr(cache_config, "max_size", None) or 64, ttl=self.ttl)
+        self._listener = InvalidationListener(
+            CACHE_INVALIDATE_CHANNEL, tuple(f"__keyspace@*__:{key}" for key in keys), self.invalidate, self.clear
+        )
+
+    def get(self, key):
+        if not self.ttl:
+            return None
+        return self._cache.get(key)
+
+    def set(self, key, value, redis_client):
+        """
+        Cache the value read from redis
+
+        Args:
+            key(str): redis key
+            value: decoded value of the key
+            redis_client(Redis): client used to listen to the invalidation of the key
+        """
+        if not self.ttl or not self._listener.ensure_started(redis_client):
+            return
+        self._cache.set(key, value)
+
+    def invalidate(self, key):
+        self._cache.pop(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    @property
+    def stats(self):
+        """
+        Hit, miss and eviction counters of the cache
+        """
+        return self._cache.stats
+
 
 class RedisCacheManage:
     """Class for managing Redis cache."""
@@ -43,6 +202,38 @@ class RedisCacheManage:
     SCANNING_HOST_KEY = "scanning_host_set"  # hashmap e.g {"host_id": "Timestamp of scan time", "host_id": 1716167968}
     LOCATION_CLUSTER = "location_cluster"  # hashmap e.g {"cluster_id": 'xxx',"cluster_name": "mock_name"}
     GROUPS_HOSTS = "groups_hosts"  # hashmap e.g {"group_id": ["host_id", "host_id"]}
+    USER_HOSTS_SUFFIX = "_allowed_hosts"  # set e.g {"", "host_id", "host_id"}
+    # version of the user hosts set, e.g "3:<digest of the user groups>", see _user_hosts_version
+    USER_HOSTS_VERSION_SUFFIX = "_allowed_hosts:version"
+    GROUPS_HOSTS_GENERATION = "groups_hosts:generation"  # increased when groups_hosts is refilled
+    # member of every user hosts set, so the set of a user without any host still exists
+    EMPTY_MEMBER = ""
+    USER_HOSTS_EXPIRE = 60
+    # groups_hosts is fresh for GROUPS_HOSTS_EXPIRE seconds, then it's served as stale value while it's refilled
+    GROUPS_HOSTS_EXPIRE = 60
+    GROUPS_HOSTS_STALE = 60
+    FRESH_SUFFIX = ":fresh"
+    # lease of refilling a missed key, only the holder of it calls the remote api
+    REFILL_LOCK_PREFIX = "refill_lock:"
+    REFILL_LEASE = 10
+    REFILL_POLL_INTERVAL = 0.05
+    # delete the lock only when it's still held by us
+    _RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+    _single_flight = SingleFlight()
+
+    # cache items that get_many can fetch, e.g {name: (attribute of the redis key, redis type, json decode values)}
+    CACHE_ITEMS = {
+        "get_user_clusters": ("user_clusters_key", "hash", False),
+        "get_user_group_hosts": ("user_groups_key", "hash", False),
+        "user_role": ("user_roles_key", "string", False),
+        "get_user_cluster_private_key": ("user_private_key", "hash", True),
+        "clusters": ("ALL_CLUSTER_KEY", "hash", True),
+        "cluster_groups": ("CLUSTER_GROUPS", "hash", True),
+        "location_cluster": ("LOCATION_CLUSTER", "hash", False),
+        "all_groups_hosts": ("GROUPS_HOSTS", "hash", True),
+    }
+    # cache items shared by all the users, they are also cached in the process
+    SHARED_ITEMS = ("clusters", "cluster_groups", "location_cluster", "all_groups_hosts")
 
     def __init__(self, domain: str, redis_client: Redis = None, username=None) -> None:
         """
@@ -76,10 +267,85 @@ class RedisCacheManage:
 
         return True, response.get("data")
 
+    def _acquire_lease(self, lock_key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            if self.client.set(lock_key, token, nx=True, px=self.REFILL_LEASE * 1000):
+                return token
+            return None
+        except RedisError as error:
+            LOGGER.error(error)
+            # refill without the lease rather than failing the request
+            return token
+
+    def _release_lease(self, lock_key: str, token: str):
+        try:
+            self.client.eval(self._RELEASE_SCRIPT, 1, lock_key, token)
+        except RedisError as error:
+            LOGGER.error(error)
+
+    def _wait_lease(self, lock_key: str):
+        deadline = time.monotonic() + self.REFILL_LEASE
+        try:
+            while self.client.exists(lock_key) and time.monotonic() < deadline:
+                time.sleep(self.REFILL_POLL_INTERVAL)
+        except RedisError as error:
+            LOGGER.error(error)
+
+    def _refill(self, flight_key: str, refill, wait=True):
+        """
+        Refill a missed key once among all the threads and processes: the threads of this process share
+        one call, and the processes share a redis lock, the processes without the lock wait for it's released
+        and read the key again
+
+        Args:
+            flight_key (str): name of the refill, e.g the api and the user it's called for
+            refill (callable): function calling the remote api and returning the value
+            wait (bool): whether to wait for the running refill, the caller serves the stale value when it's False
+
+        Returns:
+            result of refill, None when it's refilled by others and the key should be read again
+        """
+
+        def refill_with_lease():
+            lock_key = self.REFILL_LOCK_PREFIX + flight_key
+            token = self._acquire_lease(lock_key)
+            if token is None:
+                if wait:
+                    self._wait_lease(lock_key)
+                return None
+            try:
+                return refill()
+            finally:
+                self._release_lease(lock_key, token)
+
+        return self._single_flight.do(flight_key, refill_with_lease, wait=wait, timeout=self.REFILL_LEASE)
+
+    def _refill_permission(self):
+        # user clusters, user groups and user role are refilled by the same api
+        self._refill(
+            f"{CLUSTER_PERMISSION_CACHE}:{self.username}",
+            lambda: self._remote_api(url=self.domain + CLUSTER_PERMISSION_CACHE),
+        )
+
     @property
     def username(self):
         return self._username or g.username
 
+    @property
+    def request_memo(self) -> Optional[dict]:
+        """
+        Values of the cache items decoded in the current request, None when there is no request
+        """
+        if not has_app_context():
+            return None
+        if "redis_cache_memo" not in g:
+            g.redis_cache_memo = dict()
+        return g.redis_cache_memo
+
+    def memo_key(self, name: str) -> tuple:
+        return name, self._username or g.get("username")
+
     @property
     def headers(self):
         return g.headers
@@ -100,6 +366,14 @@ class RedisCacheManage:
     def user_private_key(self) -> str:
         return self.username + RedisCacheManage.USER_CLUSTER_PRIVATE_KEY_SUFFIX
 
+    @property
+    def user_hosts_key(self) -> str:
+        return self.username + RedisCacheManage.USER_HOSTS_SUFFIX
+
+    @property
+    def user_hosts_version_key(self) -> str:
+        return self.username + RedisCacheManage.USER_HOSTS_VERSION_SUFFIX
+
     def hash(self, key: str) -> Optional[dict]:
         """
         Queries hash type data from Redis.
@@ -111,8 +385,8 @@ class RedisCacheManage:
             Optional[dict]: query result.
         """
         try:
-            if self.client.exists(key):
-                return self.client.hgetall(key)
+            # redis never keeps an empty hash, so an empty result means the key doesn't exist
+            return self.client.hgetall(key) or None
         except RedisError as error:
             LOGGER.error(error)
 
@@ -129,8 +403,7 @@ class RedisCacheManage:
             Optional[str]: query result.
         """
         try:
-            if self.client.exists(key):
-                return self.client.get(key)
+            return self.client.get(key)
         except RedisError as error:
             LOGGER.error(error)
 
@@ -147,8 +420,7 @@ class RedisCacheManage:
             Optional[list]: query result.
         """
         try:
-            if self.client.exists(key):
-                return [item for item in self.client.lrange(key, 0, -1)]
+            return self.client.lrange(key, 0, -1) or None
 
         except RedisError as error:
             LOGGER.error(error)
@@ -165,8 +437,7 @@ class RedisCacheManage:
             Optional[set]: query result.
         """
         try:
-            if self.client.exists(key):
-                return {item for item in self.client.smembers(key)}
+            return set(self.client.smembers(key)) or None
 
         except RedisError as error:
             LOGGER.error(error)
@@ -188,6 +459,7 @@ class RedisCacheManage:
             LOGGER.debug(error)
         return data
 
+    @request_cached
     def get_user_clusters(self) -> Optional[dict]:
         """
         Retrieves user clusters information from Redis.
@@ -199,9 +471,10 @@ class RedisCacheManage:
         if data is not None:
             return data
 
-        _, _ = self._remote_api(url=self.domain + CLUSTER_PERMISSION_CACHE)
+        self._refill_permission()
         return self.hash(self.user_clusters_key) or dict()
 
+    @request_cached
     def get_user_group_hosts(self) -> Optional[dict]:
         """
         Retrieves user groups information from Redis.
@@ -213,10 +486,12 @@ class RedisCacheManage:
         if data is not None:
             return data
 
-        _, _ = self._remote_api(url=self.domain + CLUSTER_PERMISSION_CACHE)
+        self._refill_permission()
         return self.hash(self.user_groups_key) or dict()
 
     @property
+    @request_cached
+    @local_cached
     def clusters(self) -> Optional[dict]:
         """
         Retrieves clusters information from Redis.
@@ -228,49 +503,56 @@ class RedisCacheManage:
         if data is not None:
             return {key: self._json_decode(value) for key, value in data.items()}
 
-        response, _ = self._remote_api(url=self.domain + CLUSTER_MANAGE)
-        if response:
-            cache_data = self.hash(self.ALL_CLUSTER_KEY) or dict()
-            return {key: self._json_decode(value) for key, value in cache_data.items()}
-
-        return dict()
+        self._refill(CLUSTER_MANAGE, lambda: self._remote_api(url=self.domain + CLUSTER_MANAGE))
+        cache_data = self.hash(self.ALL_CLUSTER_KEY) or dict()
+        return {key: self._json_decode(value) for key, value in cache_data.items()}
 
     @property
+    @request_cached
     def user_role(self):
         role = self.string(self.user_roles_key)
         if role is not None:
             return role
-        response, _ = self._remote_api(url=self.domain + CLUSTER_PERMISSION_CACHE)
-        return self.string(self.user_roles_key) if response else None
+        self._refill_permission()
+        return self.string(self.user_roles_key)
 
     @property
+    @request_cached
+    @local_cached
     def cluster_groups(self):
         data = self.hash(self.CLUSTER_GROUPS)
         if data is not None:
             return {key: self._json_decode(value) for key, value in data.items()}
 
-        response, _ = self._remote_api(url=self.domain + CLUSTER_GROUP_CACHE)
-
-        if response:
-            cache_data = self.hash(self.CLUSTER_GROUPS) or dict()
-            return {key: self._json_decode(value) for key, value in cache_data.items()}
-
-        return dict()
+        self._refill(CLUSTER_GROUP_CACHE, lambda: self._remote_api(url=self.domain + CLUSTER_GROUP_CACHE))
+        cache_data = self.hash(self.CLUSTER_GROUPS) or dict()
+        return {key: self._json_decode(value) for key, value in cache_data.items()}
 
     @property
+    @request_cached
+    @local_cached
     def location_cluster(self):
         data = self.hash(self.LOCATION_CLUSTER)
         if data is not None:
             return data
 
-        _, _ = self._remote_api(url=self.domain + LOCAL_CLUSTER_INFO)
+        self._refill(LOCAL_CLUSTER_INFO, lambda: self._remote_api(url=self.domain + LOCAL_CLUSTER_INFO))
         return self.hash(self.LOCATION_CLUSTER) or dict()
 
     @property
+    @request_cached
     def get_user_cluster_private_key(self):
         data = self.hash(self.user_private_key)
         if data is not None:
             return {key: self._json_decode(value) for key, value in data.items()}
+        cache_data = self._refill(f"{CLUSTER_PRIVATE_KEY}:{self.username}", self._refill_private_key)
+        if cache_data is None:
+            # refilled by another process
+            data = self.hash(self.user_private_key) or dict()
+            cache_data = {key: self._json_decode(value) for key, value in data.items()}
+        return cache_data
+
+    def _refill_private_key(self) -> dict:
         response, data = self._remote_api(url=self.domain + CLUSTER_PRIVATE_KEY)
         if not response or not data:
             return dict()
@@ -283,22 +565,229 @@ class RedisCacheManage:
             )
             for item in data
         }
-        RedisProxy.redis_connect.hmset(
-            self.user_private_key, {cluster_id: json.dumps(key) for cluster_id, key in cache_data.items()}
+        self.client.hset(
+            self.user_private_key, mapping={cluster_id: json.dumps(key) for cluster_id, key in cache_data.items()}
         )
         return cache_data
 
     @property
+    @request_cached
     def all_groups_hosts(self):
-        data = self.hash(self.GROUPS_HOSTS)
-        if data is not None:
-            return {key: self._json_decode(value) for key, value in data.items()}
+        """
+        Hosts of all the groups, the stale value is served while one of the requests refills it
 
+        Returns:
+            dict: e.g {"group_id": ["host_id", "host_id"]}
+        """
+        value = shared_item_cache.get(self.GROUPS_HOSTS)
+        if value is not None:
+            return value
+        data, fresh = None, False
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.hgetall(self.GROUPS_HOSTS)
+            pipeline.exists(self.GROUPS_HOSTS + self.FRESH_SUFFIX)
+            data, fresh = pipeline.execute()
+        except RedisError as error:
+            LOGGER.error(error)
+        return self._resolve_groups_hosts(data, fresh)
+
+    def _resolve_groups_hosts(self, data, fresh) -> dict:
+        """
+        Decode groups_hosts read from redis, a stale value is refilled by one of the requests and served by
+        the others, only a fresh value is cached in the process
+
+        Args:
+            data (dict): groups_hosts in redis
+            fresh (bool): whether the fresh marker of groups_hosts exists
+        """
+        value = None
+        if data and fresh:
+            value = {key: self._json_decode(item) for key, item in data.items()}
+        elif data:
+            value = self._refill(ALL_HOST_GROUP_MAP, self._refill_groups_hosts, wait=False)
+            if value is None:
+                return {key: self._json_decode(item) for key, item in data.items()}
+        else:
+            value = self._refill(ALL_HOST_GROUP_MAP, self._refill_groups_hosts)
+            if value is None:
+                # refilled by another process
+                data = self.hash(self.GROUPS_HOSTS) or dict()
+                value = {key: self._json_decode(item) for key, item in data.items()}
+        if value:
+            shared_item_cache.set(self.GROUPS_HOSTS, value, self.client)
+        return value
+
+    def _refill_groups_hosts(self) -> dict:
         response, data = self._remote_api(url=self.domain + ALL_HOST_GROUP_MAP)
-        if response and data:
-            hash_data = {group_id: json.dumps(host_ids) for group_id, host_ids in data.items()}
-            RedisProxy.redis_connect.hmset(
-                self.GROUPS_HOSTS, {group_id: host_ids for group_id, host_ids in hash_data.items()}
+        if not response:
+            return None
+        if not data:
+            return data
+
+        expire = jitter(self.GROUPS_HOSTS_EXPIRE)
+        try:
+            pipeline = self.client.pipeline()
+            pipeline.delete(self.GROUPS_HOSTS)
+            pipeline.hset(
+                self.GROUPS_HOSTS, mapping={group_id: json.dumps(host_ids) for group_id, host_ids in data.items()}
             )
-            RedisProxy.redis_connect.expire(self.GROUPS_HOSTS, 60)
-        return data if response else dict()
+            pipeline.expire(self.GROUPS_HOSTS, expire + self.GROUPS_HOSTS_STALE)
+            pipeline.set(self.GROUPS_HOSTS + self.FRESH_SUFFIX, 1, ex=expire)
+            # the user hosts sets built from the previous groups_hosts are missed from now on
+            pipeline.incr(self.GROUPS_HOSTS_GENERATION)
+            pipeline.execute()
+        except RedisError as error:
+            LOGGER.error(error)
+        publish_cache_invalidation(self.client, self.GROUPS_HOSTS)
+        return data
+
+    def _decode_item(self, name: str, value):
+        _, _, json_decode = self.CACHE_ITEMS[name]
+        if json_decode:
+            return {key: self._json_decode(item) for key, item in value.items()}
+        return value
+
+    def get_many(self, *names) -> dict:
+        """
+        Fetch several cache items in one pipeline, the missed items are refilled one by one
+
+        Args:
+            names (str): names of the items in CACHE_ITEMS, all the items are fetched when it's empty
+
+        Returns:
+            dict: e.g {"user_role": "administrator", "clusters": {"cluster_id": {...}}}
+        """
+        names = names or tuple(self.CACHE_ITEMS)
+        memo = self.request_memo
+        values = dict()
+        for name in self.SHARED_ITEMS:
+            if name in names and (memo is None or self.memo_key(name) not in memo):
+                value = shared_item_cache.get(getattr(self, self.CACHE_ITEMS[name][0]))
+                if value is not None:
+                    values[name] = value
+                    if memo is not None:
+                        memo[self.memo_key(name)] = value
+        pending = [name for name in names if name not in values and (memo is None or self.memo_key(name) not in memo)]
+        results = [None] * len(pending)
+        groups_hosts_fresh = False
+        if pending:
+            pipeline = self.client.pipeline(transaction=False)
+            for name in pending:
+                key_attr, redis_type, _ = self.CACHE_ITEMS[name]
+                if redis_type == "hash":
+                    pipeline.hgetall(getattr(self, key_attr))
+                else:
+                    pipeline.get(getattr(self, key_attr))
+            if "all_groups_hosts" in pending:
+                pipeline.exists(self.GROUPS_HOSTS + self.FRESH_SUFFIX)
+            try:
+                results = pipeline.execute()
+                if "all_groups_hosts" in pending:
+                    groups_hosts_fresh = results.pop()
+            except RedisError as error:
+                LOGGER.error(error)
+
+        for name, value in zip(pending, results):
+            if name == "all_groups_hosts":
+                # served stale or refilled like the property, it's missed in redis when it's empty
+                if value:
+                    values[name] = self._resolve_groups_hosts(value, groups_hosts_fresh)
+                    if memo is not None:
+                        memo[self.memo_key(name)] = values[name]
+                continue
+            if value:
+                values[name] = self._decode_item(name, value)
+                if name in self.SHARED_ITEMS:
+                    shared_item_cache.set(getattr(self, self.CACHE_ITEMS[name][0]), values[name], self.client)
+                if memo is not None:
+                    memo[self.memo_key(name)] = values[name]
+        for name in names:
+            if name not in values:
+                # memoized in the request, or missed in redis and refilled by the item itself
+                item = getattr(self, name)
+                values[name] = item() if callable(item) else item
+        return values
+
+    @staticmethod
+    def _user_hosts_version(generation, user_groups) -> str:
+        # the user hosts set is rebuilt when groups_hosts is refilled or the groups of the user change
+        digest = hashlib.sha1(json.dumps(sorted((user_groups or dict()).items())).encode("utf-8")).hexdigest()
+        return "%s:%s" % (generation or 0, digest)
+
+    def _build_user_hosts(self, generation=None) -> set:
+        """
+        Collect the hosts in the groups of the user and save them as a redis set with its version
+
+        Args:
+            generation (str): generation of groups_hosts read with the set, the set isn't saved without it
+
+        Returns:
+            set: host ids in string
+        """
+        user_groups = self.get_user_group_hosts()
+        groups_hosts = self.all_groups_hosts if user_groups else dict()
+        host_ids = {str(host_id) for group_id in user_groups for host_id in groups_hosts.get(group_id) or []}
+        if generation is None:
+            return host_ids
+        expire = jitter(self.USER_HOSTS_EXPIRE)
+        try:
+            pipeline = self.client.pipeline()
+            pipeline.delete(self.user_hosts_key)
+            pipeline.sadd(self.user_hosts_key, self.EMPTY_MEMBER, *host_ids)
+            pipeline.expire(self.user_hosts_key, expire)
+            pipeline.set(self.user_hosts_version_key, self._user_hosts_version(generation, user_groups), ex=expire)
+            pipeline.execute()
+        except RedisError as error:
+            LOGGER.error(error)
+        return host_ids
+
+    def has_host_permission(self, host_id) -> bool:
+        """
+        Whether the host is in the groups of the user, it's a single pipeline when the index is up to date,
+        the index is rebuilt when groups_hosts is refilled or gone, or when the groups of the user change
+
+        Args:
+            host_id (int/str): host id
+
+        Returns:
+            bool
+        """
+        host_id = str(host_id)
+        generation = None
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.get(self.GROUPS_HOSTS_GENERATION)
+            pipeline.exists(self.GROUPS_HOSTS)
+            pipeline.hgetall(self.user_groups_key)
+            pipeline.get(self.user_hosts_version_key)
+            pipeline.sismember(self.user_hosts_key, host_id)
+            generation, groups_hosts_exists, user_groups, version, is_member = pipeline.execute()
+            generation = generation or 0
+            if groups_hosts_exists and version == self._user_hosts_version(generation, user_groups):
+                return bool(is_member)
+        except RedisError as error:
+            LOGGER.error(error)
+
+        return host_id in self._build_user_hosts(generation)
+
+
+shared_item_cache = SharedItemCache(
+    tuple(getattr(RedisCacheManage, RedisCacheManage.CACHE_ITEMS[name][0]) for name in RedisCacheManage.SHARED_ITEMS)
+)
+
+
+def publish_cache_invalidation(redis_client, key):
+    """
+    Notify all the processes to drop the process-local value of a shared cache item, it should be called
+    after the redis key is rewritten when the keyspace events of redis are not enabled
+
+    Args:
+        redis_client(Redis)
+        key(str): redis key, e.g clusters
+    """
+    shared_item_cache.invalidate(key)
+    try:
+        redis_client.publish(CACHE_INVALIDATE_CHANNEL, key)
+    except RedisError as error:
+        LOGGER.error(error)
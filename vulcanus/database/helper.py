@@ -15,14 +15,25 @@ Time: 2021-12-21 11:47:57
 Author: peixiaochao
 Description: functions about of database proxy
 """
+import base64
+import json
 import time
 import math
-from sqlalchemy import create_engine
+from sqlalchemy import and_, create_engine, event, or_
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql.expression import desc, asc
 
+from vulcanus.database.pool import TimedQueuePool, instrument_pool
 from vulcanus.restful.resp.state import PARTIAL_SUCCEED, SUCCEED
 
 
+def _mysql_engine_url(host, port, username, password, database):
+    if username and password:
+        return f"mysql+pymysql://{username}:{password}@{host}:{port}/{database}"
+    return f"mysql+pymysql://@{host}:{port}/{database}"
+
+
 def make_mysql_engine_url(configuration):
     """
     Create engine url of mysql
@@ -33,32 +44,108 @@ def make_mysql_engine_url(configuration):
     Returns:
         str: url of engine
     """
-    mysql_host = configuration.mysql.host
-    mysql_port = configuration.mysql.port
-    username = configuration.mysql.username
-    password = configuration.mysql.password
-    mysql_database_name = configuration.mysql.database
-    if username and password:
-        url = f"mysql+pymysql://{username}:{password}@{mysql_host}:{mysql_port}/{mysql_database_name}"
-    else:
-        url = f"mysql+pymysql://@{mysql_host}:{mysql_port}/{mysql_database_name}"
+    mysql = configuration.mysql
+    return _mysql_engine_url(mysql.host, mysql.port, mysql.username, mysql.password, mysql.database)
+
+
+def make_mysql_replica_urls(configuration):
+    """
+    Create engine urls of the read replicas in mysql config, the port, username and password of the
+    primary are used when they are not set for a replica, e.g
+        replicas:
+          - host: 192.168.1.2
+          - host: 192.168.1.3
+            port: 3307
+
+    Args:
+        configuration (Config): configuration object of certain module
 
-    return url
+    Returns:
+        list: urls of the replica engines
+    """
+    mysql = configuration.mysql
+    return [
+        _mysql_engine_url(
+            replica.host,
+            replica.port or mysql.port,
+            replica.username or mysql.username,
+            replica.password or mysql.password,
+            mysql.database,
+        )
+        for replica in mysql.replicas or []
+    ]
+
+
+def make_mysql_engine_options(configuration):
+    """
+    Read the options of the connection pool from the mysql config, the unset options are not returned
 
+    Args:
+        configuration (Config): configuration object of certain module
 
-def create_database_engine(url, pool_size, pool_recycle):
+    Returns:
+        dict: keyword arguments of create_database_engine except pool_size and pool_recycle
     """
-    Create database connection pool
+    options = dict()
+    for option in ("max_overflow", "pool_timeout", "pool_pre_ping", "pool_use_lifo", "statement_timeout"):
+        value = getattr(configuration.mysql, option, None)
+        if value is not None:
+            options[option] = value
+    return options
+
+
+def _set_statement_timeout(engine, statement_timeout):
+    # max_execution_time of mysql aborts the SELECT statements running longer than it, in milliseconds
+    @event.listens_for(engine, "connect")
+    def set_max_execution_time(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SET SESSION max_execution_time = %d" % int(statement_timeout))
+        finally:
+            cursor.close()
+
+
+def create_database_engine(
+    url,
+    pool_size,
+    pool_recycle,
+    max_overflow=None,
+    pool_timeout=None,
+    pool_pre_ping=True,
+    pool_use_lifo=None,
+    statement_timeout=None,
+):
+    """
+    Create database connection pool, the checkouts, invalidations and checkout waits of the pool are
+    recorded, see vulcanus.database.pool.pool_status
 
     Args:
         url(str): engine url
         pool_size(int): size of pool
         pool_recycle(int): time that pool recycle the connection
+        max_overflow(int): number of connections opened beyond pool_size at most, 10 by default
+        pool_timeout(int): seconds to wait for a connection when the pool is full, 30 by default
+        pool_pre_ping(bool): test the connection before it's checked out
+        pool_use_lifo(bool): reuse the most recently returned connection, so the idle ones can be recycled
+        statement_timeout(int): milliseconds that a SELECT statement of mysql can run, 0 or None is unlimited
 
     Returns:
         engine
     """
-    engine = create_engine(url, pool_size=pool_size, pool_recycle=pool_recycle, pool_pre_ping=True)
+    url = make_url(url)
+    options = dict(pool_size=pool_size, pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping)
+    for option, value in (("max_overflow", max_overflow), ("pool_timeout", pool_timeout)):
+        if value is not None:
+            options[option] = value
+    if pool_use_lifo:
+        options["pool_use_lifo"] = pool_use_lifo
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        options["poolclass"] = TimedQueuePool
+
+    engine = create_engine(url, **options)
+    if statement_timeout and engine.dialect.name == "mysql":
+        _set_statement_timeout(engine, statement_timeout)
+    instrument_pool(engine)
     return engine
 
 
@@ -117,9 +204,11 @@ def timestr_unix(time_str):
     return int(time.mktime(time_format))
 
 
-def sort_and_page(query_result, column, direction, per_page, page):
+def sort_and_page(query_result, column, direction, per_page, page, cursor=None, primary_key=None, count=True):
     """
-    Sort and paginate the query result
+    Sort and paginate the query result, the page is located by offset, or by keyset when primary_key is set:
+    the records after the last record of the previous page are queried, which is as fast as the first page
+    no matter how deep the page is
     Args:
         query_result (sqlalchemy.orm.query.Query): query result
         column (sqlalchemy.orm.attributes.InstrumentedAttribute/
@@ -127,18 +216,30 @@ def sort_and_page(query_result, column, direction, per_page, page):
         direction (str/None): desc or asc
         per_page (int/None): number of record per page, if per_page = None, return all
         page (int/None): which page to return, if page = None, return all
+        cursor (str/None): cursor of the next page returned by next_page_cursor, the first page is returned
+            when it's None, only used with primary_key
+        primary_key (sqlalchemy.orm.attributes.InstrumentedAttribute/None): primary key of the table, it breaks
+            the ties of column in keyset pagination, column should be a not null column of the table then
+        count (bool): whether to count the records, total_page is None when it's False
 
     Returns:
         sqlalchemy.orm.query.Query
+        int/None: total page
     """
     total_page = 1
-    total_count = query_result.count()
-
-    if not total_count:
-        return query_result, total_page
+    if count:
+        total_count = query_result.count()
+        if not total_count:
+            return query_result, total_page
+    else:
+        total_count, total_page = None, None
 
     direction = desc if direction == "desc" else asc
 
+    if primary_key is not None:
+        query_result = _keyset_page(query_result, column, direction, per_page, cursor, primary_key)
+        return query_result, _total_page(total_count, per_page, total_page)
+
     # when column is a sqlalchemy.sql.functions.count object, like func.count(Hots.host_id),
     # it has no boolean value, so "if column:" here is not available
     if column is not None:
@@ -147,12 +248,82 @@ def sort_and_page(query_result, column, direction, per_page, page):
     if page and per_page:
         page = int(page)
         per_page = int(per_page)
-        total_page = math.ceil(total_count / per_page)
+        total_page = _total_page(total_count, per_page, total_page)
         query_result = query_result.offset((page - 1) * per_page).limit(per_page)
 
     return query_result, total_page
 
 
+def _total_page(total_count, per_page, default):
+    if total_count is None or not per_page:
+        return default
+    return math.ceil(total_count / int(per_page))
+
+
+def _keyset_page(query_result, column, direction, per_page, cursor, primary_key):
+    columns = [primary_key] if column is None else [column, primary_key]
+    if cursor:
+        last_values = decode_page_cursor(cursor)
+        if len(last_values) != len(columns):
+            raise ValueError("Invalid page cursor")
+        after = (lambda col, value: col < value) if direction is desc else (lambda col, value: col > value)
+        # (column, primary_key) > (last column, last primary_key), expanded so the index of column can be used
+        conditions = []
+        for index, col in enumerate(columns):
+            equals = [columns[pre] == last_values[pre] for pre in range(index)]
+            conditions.append(and_(*equals, after(col, last_values[index])))
+        query_result = query_result.filter(or_(*conditions))
+
+    query_result = query_result.order_by(*(direction(col) for col in columns))
+    if per_page:
+        query_result = query_result.limit(int(per_page))
+    return query_result
+
+
+def encode_page_cursor(values):
+    """
+    Encode the values locating a page into an opaque url-safe cursor
+    """
+    text = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_cursor(cursor):
+    """
+    Decode the cursor made by encode_page_cursor, ValueError is raised when it's invalid
+
+    Returns:
+        list
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid page cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid page cursor")
+    return values
+
+
+def next_page_cursor(records, column, primary_key, per_page):
+    """
+    Make the cursor of the page after the records, which are returned by sort_and_page with primary_key
+
+    Args:
+        records (list): records of the current page
+        column (sqlalchemy.orm.attributes.InstrumentedAttribute/None): the column that sort based on
+        primary_key (sqlalchemy.orm.attributes.InstrumentedAttribute): primary key of the table
+        per_page (int/None): number of record per page
+
+    Returns:
+        str/None: opaque cursor, None when it's the last page
+    """
+    if not records or not per_page or len(records) < int(per_page):
+        return None
+    last_record = records[-1]
+    columns = [primary_key] if column is None else [column, primary_key]
+    return encode_page_cursor([getattr(last_record, col.key) for col in columns])
+
+
 def judge_return_code(result, default_stat):
     """
     Generate return result according to result
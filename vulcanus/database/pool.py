@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description: metrics of the connection pool of database engine
+"""
+import bisect
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+__all__ = ("PoolMetrics", "TimedQueuePool", "instrument_pool", "get_pool_metrics", "pool_status")
+
+_ENGINE_METRICS = weakref.WeakKeyDictionary()
+
+
+class PoolMetrics:
+    """
+    Counters of the connection pool of an engine, they are updated by the pool events of sqlalchemy,
+    and the seconds waited for a connection are observed by TimedQueuePool
+    """
+
+    # upper bounds of the buckets of the checkout wait histogram in seconds
+    WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        # the last bucket counts the waits longer than all the bounds
+        self._wait_buckets = [0] * (len(self.WAIT_BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.soft_invalidations += 1
+
+    def observe_wait(self, seconds):
+        """
+        Record the seconds waited for a connection
+        """
+        index = bisect.bisect_left(self.WAIT_BUCKETS, seconds)
+        with self._lock:
+            self.wait_count += 1
+            self.wait_sum += seconds
+            self._wait_buckets[index] += 1
+
+    @property
+    def wait_histogram(self):
+        """
+        Cumulative counts of the checkout waits, like the histogram of prometheus
+
+        Returns:
+            dict: e.g {"0.001": 10, "0.005": 12, ..., "+Inf": 13}
+        """
+        histogram, count = dict(), 0
+        for bound, bucket in zip(self.WAIT_BUCKETS + ("+Inf",), self._wait_buckets):
+            count += bucket
+            histogram[str(bound)] = count
+        return histogram
+
+    @property
+    def checked_out(self):
+        return self.checkouts - self.checkins
+
+    @property
+    def stats(self):
+        """
+        Counters of the pool
+
+        Returns:
+            dict
+        """
+        return dict(
+            checkouts=self.checkouts,
+            checkins=self.checkins,
+            checked_out=self.checked_out,
+            invalidations=self.invalidations,
+            soft_invalidations=self.soft_invalidations,
+            wait_count=self.wait_count,
+            wait_sum=self.wait_sum,
+            wait_histogram=self.wait_histogram,
+        )
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that observes the seconds waited for a connection, which includes the wait for a connection
+    returned to the full pool and the time of making a new connection
+    """
+
+    metrics = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # the pool is recreated by engine.dispose
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def instrument_pool(engine):
+    """
+    Listen to the pool events of the engine, the engine is instrumented once
+
+    Args:
+        engine(Engine): database engine
+
+    Returns:
+        PoolMetrics
+    """
+    metrics = _ENGINE_METRICS.get(engine)
+    if metrics is None:
+        metrics = _ENGINE_METRICS[engine] = PoolMetrics()
+        event.listen(engine, "checkout", metrics.on_checkout)
+        event.listen(engine, "checkin", metrics.on_checkin)
+        event.listen(engine, "invalidate", metrics.on_invalidate)
+        event.listen(engine, "soft_invalidate", metrics.on_soft_invalidate)
+        if isinstance(engine.pool, TimedQueuePool):
+            engine.pool.metrics = metrics
+    return metrics
+
+
+def get_pool_metrics(engine):
+    """
+    Get the metrics of an instrumented engine
+
+    Returns:
+        PoolMetrics/None
+    """
+    return _ENGINE_METRICS.get(engine)
+
+
+def pool_status(engine):
+    """
+    Current status and metrics of the pool of the engine
+
+    Returns:
+        dict: e.g {"size": 100, "checked_out": 3, "overflow": -97, "checkouts": 1024, ...}
+    """
+    status = dict()
+    metrics = get_pool_metrics(engine)
+    if metrics is not None:
+        status.update(metrics.stats)
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return status
@@ -15,16 +15,32 @@ Time:
 Author:
 Description: Database proxy
 """
+import hashlib
+import json
+import queue
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from functools import wraps
+from functools import partial, wraps
+from itertools import chain, islice
+from urllib.parse import quote
 
 import sqlalchemy
+from flask import g, has_app_context
 from elasticsearch import Elasticsearch, ElasticsearchException, helpers, TransportError, NotFoundError
 from requests.exceptions import ConnectionError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.exc import SQLAlchemyError, DisconnectionError
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from urllib3.exceptions import LocationValueError
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 try:
     from prometheus_api_client import PrometheusConnect, PrometheusApiClientException
 except ImportError:
@@ -32,11 +48,52 @@ except ImportError:
     PrometheusApiClientException = None
 import redis
 from redis import Redis, ConnectionPool
+from vulcanus.local_cache import LocalCache
 from vulcanus.log.log import LOGGER
 from vulcanus.restful.resp import state
 from vulcanus.conf import configuration
 from vulcanus.common import singleton
 from vulcanus.exceptions import DatabaseConnectionFailed, DatabaseError
+from vulcanus.database.helper import decode_page_cursor, encode_page_cursor
+from vulcanus.database.router import RoutingSession, mark_written, read_from_replica
+
+
+_SESSION_SCOPE = "_vulcanus_session_scope"
+
+
+def _drop_scope(scope):
+    session = session_registry.registry.registry.pop(scope, None)
+    if session is not None:
+        session.close()
+
+
+def _session_scope():
+    # a session per flask app context, i.e per request, or per thread out of the app context. The scopes are
+    # objects instead of ids, which are reused, so a new context never gets the session left by an old one
+    if not has_app_context():
+        return threading.current_thread()
+    context_globals = g._get_current_object()
+    scope = getattr(context_globals, _SESSION_SCOPE, None)
+    if scope is None:
+        scope = object()
+        setattr(context_globals, _SESSION_SCOPE, scope)
+        # the session is dropped with the context even if the teardown of the app isn't registered
+        weakref.finalize(context_globals, _drop_scope, scope)
+    return scope
+
+
+# sessions of MysqlProxy, they are created on first use and removed when the last proxy using it is closed
+# or when the app context is torn down. The proxies of a request or a thread share the session, a commit of
+# one of them commits the work of all, while a failed write rolls back only itself, see MysqlProxy._write
+session_registry = scoped_session(sessionmaker(class_=RoutingSession), scopefunc=_session_scope)
+_SESSION_USERS = "vulcanus_proxy_users"
+
+
+def remove_session(exception=None):
+    """
+    Close and remove the session of the current scope, it's registered as teardown_appcontext of the app
+    """
+    session_registry.remove()
 
 
 def connect_database(status=state.DATABASE_CONNECT_ERROR, return_value=None):
@@ -83,6 +140,13 @@ class MysqlProxy(DataBaseProxy):
     # MysqlProxy.engine=create_database_engine(make_mysql_engine_url(settings), pool_size, pool_recycle)
 
     engine = None
+    # router of the read replicas, select and select_iter read from the replicas when it's set e.g
+    # MysqlProxy.replica_router=ReplicaRouter(replica_engines, strategy="round_robin", max_lag=5)
+    replica_router = None
+    # number of rows written in one statement and committed together by the bulk operations
+    BULK_CHUNK_SIZE = 1000
+    # number of rows fetched from the server side cursor at a time by select_iter
+    STREAM_CHUNK_SIZE = 1000
 
     def __init__(self):
         """
@@ -93,13 +157,37 @@ class MysqlProxy(DataBaseProxy):
             raise DatabaseError("Engine is not initialized")
 
     def _create_session(self):
-        session = sessionmaker()
+        if self.session is not None:
+            return
         try:
-            session.configure(bind=MysqlProxy.engine)
-            self.session = session()
+            session = session_registry()
+            if session.bind is not MysqlProxy.engine:
+                session.bind = MysqlProxy.engine
         except (DisconnectionError, sqlalchemy.exc.SQLAlchemyError):
             LOGGER.error("Mysql connection failed.")
             raise DatabaseConnectionFailed("Mysql connection failed.")
+        if not session.info.get(_SESSION_USERS):
+            # state of the previous users, e.g the written mark which disables the read replicas
+            session.info.clear()
+        session.info[_SESSION_USERS] = session.info.get(_SESSION_USERS, 0) + 1
+        self.session = session
+
+    def close(self):
+        """
+        Release the session, it's closed and removed from the registry when no other proxy uses it
+        """
+        session, self.session = self.session, None
+        if session is None:
+            return
+        users = session.info.get(_SESSION_USERS, 1) - 1
+        session.info[_SESSION_USERS] = users
+        if users > 0:
+            return
+        # the proxy may be released in another scope, e.g by the garbage collector
+        if session_registry.registry.has() and session_registry.registry() is session:
+            session_registry.remove()
+        else:
+            session.close()
 
     def connect(self):  # pylint: disable=W0221
         """
@@ -120,8 +208,7 @@ class MysqlProxy(DataBaseProxy):
         return True
 
     def __del__(self):
-        if self.session:
-            self.session.close()
+        self.close()
 
     def __enter__(self):
         """
@@ -150,8 +237,32 @@ class MysqlProxy(DataBaseProxy):
         if isinstance(exc_type, (AttributeError)):
             raise SQLAlchemyError(exc_val)
 
-        if self.session:
-            self.session.close()
+        self.close()
+
+    def _write(self, write):
+        """
+        Call write in a savepoint and commit it. The session is shared by the proxies of a request, so a failed
+        write rolls back only its savepoint, the uncommitted work of the other proxies is kept
+
+        Returns:
+            bool: write succeed or fail
+        """
+        try:
+            with self.session.begin_nested():
+                write()
+        except sqlalchemy.exc.SQLAlchemyError as error:
+            LOGGER.error(error)
+            # failed out of the savepoint, e.g the flush of the pending changes before it
+            if not self.session.is_active:
+                self.session.rollback()
+            return False
+        try:
+            self.session.commit()
+        except sqlalchemy.exc.SQLAlchemyError as error:
+            LOGGER.error(error)
+            self.session.rollback()
+            return False
+        return True
 
     def insert(self, table, data):
         """
@@ -164,19 +275,11 @@ class MysqlProxy(DataBaseProxy):
         Returns:
             bool: insert succeed or fail
         """
-        try:
-            self.session.add(table(**data))
-            self.session.commit()
-            return True
-
-        except sqlalchemy.exc.SQLAlchemyError as error:
-            self.session.rollback()
-            LOGGER.error(error)
-            return False
+        return self._write(lambda: self.session.add(table(**data)))
 
     def select(self, table, condition):
         """
-        Query data from table
+        Query data from table, it's read from a replica when replica_router is set and the session hasn't written
 
         Args:
             table(list): table or field list of database
@@ -186,12 +289,56 @@ class MysqlProxy(DataBaseProxy):
             bool: query succeed or fail
         """
         try:
-            data = self.session.query(*table).filter_by(**condition).all()
+            with read_from_replica(self.session, MysqlProxy.replica_router):
+                data = self.session.query(*table).filter_by(**condition).all()
             return True, data
         except sqlalchemy.exc.SQLAlchemyError as error:
             LOGGER.error(error)
             return False, []
 
+    def select_iter(self, table, condition, chunk_size=None, callback=None):
+        """
+        Query data from table and fetch the rows in chunks by a server side cursor, so a large result is never
+        loaded into memory as a whole. The cursor is held by a session of the iterator, so the proxy can query
+        while iterating, and the uncommitted changes of the proxy's session are not seen.
+
+        Args:
+            table(list): table or field list of database
+            condition(dict): query condition
+            chunk_size(int): number of rows fetched at a time
+            callback(callable): called with every chunk of rows, the rows are consumed by select_iter when it's set
+
+        Returns:
+            bool: query succeed or fail
+            iterator/int: rows of the query, mapped objects for a table and tuples for a field list, its
+                succeed attribute turns False when the fetch fails midway, which ends the iteration;
+                number of the rows passed to callback when callback is set
+        """
+        chunk_size = chunk_size or self.STREAM_CHUNK_SIZE
+        with read_from_replica(self.session, MysqlProxy.replica_router) as replica:
+            session = session_registry.session_factory(bind=replica or MysqlProxy.engine)
+        try:
+            query = session.query(*table).filter_by(**condition)
+            rows = iter(query.execution_options(stream_results=True).yield_per(chunk_size))
+            # the query is executed lazily by the iterator, fetch the first row so it's executed here
+            rows = chain(list(islice(rows, 1)), rows)
+        except sqlalchemy.exc.SQLAlchemyError as error:
+            LOGGER.error(error)
+            session.close()
+            return False, 0 if callback else []
+
+        if not any(isinstance(item, type) for item in table):
+            rows = map(tuple, rows)
+        stream = _RowStream(session, rows)
+        if callback is None:
+            return True, stream
+
+        count = 0
+        for chunk in iter(lambda: list(islice(stream, chunk_size)), []):
+            callback(chunk)
+            count += len(chunk)
+        return stream.succeed, count
+
     def delete(self, table, condition):
         """
         Delete data from table
@@ -203,15 +350,209 @@ class MysqlProxy(DataBaseProxy):
         Returns:
             bool: delete succeed or fail
         """
-        try:
-            self.session.query(table).filter_by(**condition).delete()
-            self.session.commit()
-            return True
+        mark_written(self.session)
+        return self._write(lambda: self.session.query(table).filter_by(**condition).delete())
+
+    @classmethod
+    def _chunks(cls, items, chunk_size=None):
+        chunk_size = chunk_size or getattr(configuration.mysql, "bulk_chunk_size", None) or cls.BULK_CHUNK_SIZE
+        items = list(items)
+        for start in range(0, len(items), chunk_size):
+            yield items[start : start + chunk_size]
+
+    def _write_chunks(self, chunks, write):
+        """
+        Write and commit the chunks one by one, a failed chunk is rolled back without stopping the others
+
+        Returns:
+            bool: all the chunks succeed or not
+            list: failed chunks
+        """
+        fail_chunks = []
+        mark_written(self.session)
+        for chunk in chunks:
+            if not self._write(partial(write, chunk)):
+                fail_chunks.append(chunk)
+        return not fail_chunks, fail_chunks
+
+    def insert_many(self, table, data, chunk_size=None):
+        """
+        Insert rows to table in chunks, each chunk is inserted by one statement and committed once
+
+        Args:
+            table(class): table of database
+            data(list): inserted rows, e.g [{"host_id": 1, "host_name": "host1"}]
+            chunk_size(int): number of rows in a chunk, the bulk_chunk_size of mysql config is used by default
+
+        Returns:
+            bool: all the chunks are inserted or not
+            list: rows of the failed chunks, e.g [[{"host_id": 1, "host_name": "host1"}]]
+        """
+        return self._write_chunks(
+            self._chunks(data, chunk_size), lambda chunk: self.session.bulk_insert_mappings(table, chunk)
+        )
+
+    @staticmethod
+    def _upsert_statement(table, update_columns):
+        statement = mysql_insert(table.__table__)
+        if not update_columns:
+            # e.g rows of an association table, which has only primary key columns, the existing rows are kept
+            # by assigning the primary key to itself, INSERT IGNORE would turn the errors of bad rows to warnings
+            return statement.on_duplicate_key_update(
+                {column.name: column for column in table.__table__.primary_key}
+            )
+        return statement.on_duplicate_key_update({column: statement.inserted[column] for column in update_columns})
+
+    def upsert_many(self, table, data, update_columns=None, chunk_size=None):
+        """
+        Insert rows to table in chunks, the row whose primary key or unique key exists is updated,
+        by INSERT ... ON DUPLICATE KEY UPDATE of mysql
 
+        Args:
+            table(class): table of database
+            data(list): inserted rows, all the rows should have the same columns
+            update_columns(list): columns updated when the row exists, all the non primary key columns
+                of the rows by default, the existing rows are kept as they are when there is none
+            chunk_size(int): number of rows in a chunk, the bulk_chunk_size of mysql config is used by default
+
+        Returns:
+            bool: all the chunks are written or not
+            list: rows of the failed chunks
+        """
+        data = list(data)
+        if not data:
+            return True, []
+        if update_columns is None:
+            primary_keys = {column.name for column in table.__table__.primary_key}
+            update_columns = [column for column in data[0] if column not in primary_keys]
+        statement = self._upsert_statement(table, update_columns)
+        return self._write_chunks(self._chunks(data, chunk_size), lambda chunk: self.session.execute(statement, chunk))
+
+    def delete_in(self, table, column, values, chunk_size=None):
+        """
+        Delete the rows whose column is in values, values are split into chunks of IN list
+
+        Args:
+            table(class): table of database
+            column(str/InstrumentedAttribute): column name or column of the table, e.g "host_id" or Host.host_id
+            values(list): values of the column
+            chunk_size(int): number of values in a chunk, the bulk_chunk_size of mysql config is used by default
+
+        Returns:
+            bool: all the chunks are deleted or not
+            list: values of the failed chunks
+        """
+        if isinstance(column, str):
+            column = getattr(table, column)
+        return self._write_chunks(
+            self._chunks(values, chunk_size),
+            lambda chunk: self.session.query(table).filter(column.in_(chunk)).delete(synchronize_session=False),
+        )
+
+
+class _RowStream:
+    """
+    Rows of MysqlProxy.select_iter, the session holding the server side cursor is closed when the rows are
+    exhausted, when it's closed, or when the fetch fails, which is logged and ends it with succeed False
+    """
+
+    def __init__(self, session, rows):
+        self.succeed = True
+        self._session = session
+        self._rows = rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._session is None:
+            raise StopIteration
+        try:
+            return next(self._rows)
+        except StopIteration:
+            self.close()
+            raise
         except sqlalchemy.exc.SQLAlchemyError as error:
             LOGGER.error(error)
-            self.session.rollback()
-            return False
+            self.succeed = False
+            self.close()
+            raise StopIteration
+
+    def close(self):
+        session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def __del__(self):
+        self.close()
+
+
+class _TimeoutClient:
+    """
+    Wrap the client of elasticsearch to pass request_timeout to all the apis, including the namespaced apis
+    e.g indices.create, and the apis called by the helpers e.g bulk
+    """
+
+    _NAMESPACES = ("cat", "cluster", "indices", "ingest", "nodes", "snapshot", "tasks")
+
+    def __init__(self, client, request_timeout):
+        self._client = client
+        self._request_timeout = request_timeout
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name in self._NAMESPACES:
+            return _TimeoutClient(attr, self._request_timeout)
+        if callable(attr) and not name.startswith("_"):
+            return partial(attr, request_timeout=self._request_timeout)
+        return attr
+
+
+class _ScrollPages:
+    """
+    Hits of a scroll page by page, the scroll context is cleared when all the pages are fetched, when a
+    request fails, when it's closed, or when it's garbage collected, even if no page has been consumed
+    """
+
+    def __init__(self, proxy, response, scroll):
+        self._proxy = proxy
+        self._scroll = scroll
+        self._scroll_id = self._hits = None
+        try:
+            self._scroll_id = response.get("_scroll_id")
+            self._hits = response["hits"]["hits"]
+        except Exception:
+            self.close()
+            raise
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._hits is not None:
+            hits, self._hits = self._hits, None
+        elif self._scroll_id:
+            try:
+                response = self._proxy._es_db.scroll(body={"scroll_id": self._scroll_id, "scroll": self._scroll})
+                self._scroll_id = response.get("_scroll_id") or self._scroll_id
+                hits = response["hits"]["hits"]
+            except Exception:
+                self.close()
+                raise
+        else:
+            raise StopIteration
+        if not hits:
+            self.close()
+            raise StopIteration
+        return hits
+
+    def close(self):
+        scroll_id, self._scroll_id, self._hits = self._scroll_id, None, None
+        if scroll_id:
+            self._proxy._clear_scroll(scroll_id)
+
+    def __del__(self):
+        self.close()
 
 
 class ElasticsearchProxy(DataBaseProxy):
@@ -221,25 +562,140 @@ class ElasticsearchProxy(DataBaseProxy):
 
     # Class attributes of es,stores an instance of es,you need to initialize ElasticsearchProxy before using es query
     _es_db = None
-
-    def __init__(self, host=None, port=None):
+    # default options of the client, see _create_client
+    CLIENT_OPTIONS = dict(maxsize=25, timeout=60)
+    # number of documents fetched by a scroll request and the time that the scroll context is kept alive
+    SCROLL_SIZE = 1000
+    SCROLL_KEEP_ALIVE = "5m"
+    # time that the point in time of search_after is kept alive between two pages
+    PIT_KEEP_ALIVE = "1m"
+    # default options of bulk, they can be set in the elasticsearch config with the bulk_ prefix,
+    # e.g bulk_chunk_size
+    BULK_OPTIONS = dict(
+        chunk_size=500, max_chunk_bytes=100 * 1024 * 1024, thread_count=1, max_retries=3, initial_backoff=2
+    )
+    MAX_BACKOFF = 60
+    # results of the queries with cache_ttl, an index is invalidated by increasing its generation on writes
+    _result_cache = LocalCache(maxsize=getattr(configuration.elasticsearch, "query_cache_max_size", None) or 1024)
+    _index_generations = dict()
+    _generation_lock = threading.Lock()
+    # the source part of the cache key of counts
+    _COUNT_KEY = "_count"
+
+    def __init__(self, host=None, port=None, request_timeout=None):
         """
         Instance initialization
 
         Args:
             host (str)
             port (int)
+            request_timeout (int): seconds of the requests made by this proxy, it overrides the timeout of the client
         """
         self._host = host or configuration.elasticsearch.host
         self._port = port or configuration.elasticsearch.port
         if not ElasticsearchProxy._es_db:
             try:
-                ElasticsearchProxy._es_db = Elasticsearch([{"host": self._host, "port": self._port, "timeout": 60}])
+                ElasticsearchProxy._es_db = self._create_client(host, port)
             except (LocationValueError, ElasticsearchException):
                 LOGGER.error("Elasticsearch connection failed.")
                 raise DatabaseConnectionFailed("Elasticsearch connection failed.")
+        if request_timeout:
+            self._es_db = _TimeoutClient(ElasticsearchProxy._es_db, request_timeout)
+
+    @staticmethod
+    def _parse_node(node):
+        if isinstance(node, str):
+            host, _, port = node.partition(":")
+        else:
+            host, port = node.host, node.port
+        return {"host": host, "port": int(port or configuration.elasticsearch.port)}
 
-    def query(self, index, body, source=True):
+    @classmethod
+    def _create_client(cls, host=None, port=None):
+        """
+        Create the client of elasticsearch from the elasticsearch config, e.g
+            elasticsearch:
+              hosts: ["192.168.1.2:9200", "192.168.1.3:9200"]
+              maxsize: 25
+              http_compress: true
+              timeout: 60
+              max_retries: 3
+              retry_on_timeout: true
+              retry_on_status: [502, 503, 504]
+        the node of host and port is used when hosts is not set or host is passed
+
+        Returns:
+            Elasticsearch
+        """
+        es_config = configuration.elasticsearch
+        if host or not es_config.hosts:
+            nodes = [{"host": host or es_config.host, "port": port or es_config.port}]
+        else:
+            nodes = [cls._parse_node(node) for node in es_config.hosts]
+        options = dict(
+            maxsize=es_config.maxsize or cls.CLIENT_OPTIONS["maxsize"],
+            http_compress=bool(es_config.http_compress),
+            timeout=es_config.timeout or cls.CLIENT_OPTIONS["timeout"],
+            retry_on_timeout=bool(es_config.retry_on_timeout),
+        )
+        if es_config.max_retries is not None:
+            options["max_retries"] = es_config.max_retries
+        if es_config.retry_on_status:
+            options["retry_on_status"] = tuple(es_config.retry_on_status)
+        return Elasticsearch(nodes, **options)
+
+    def health(self):
+        """
+        Probe the health of the cluster and the latency of the request
+
+        Returns:
+            bool: the cluster is available or not, it's not when the status is red
+            dict: e.g {"status": "green", "latency": 3.512, "number_of_nodes": 3}, latency is in milliseconds
+        """
+        start = time.perf_counter()
+        try:
+            health = self._es_db.cluster.health()
+        except ElasticsearchException as error:
+            LOGGER.error(error)
+            return False, dict(status=None, latency=None, number_of_nodes=0)
+        latency = round((time.perf_counter() - start) * 1000, 3)
+        status = dict(status=health.get("status"), latency=latency, number_of_nodes=health.get("number_of_nodes"))
+        return status["status"] != "red", status
+
+    @staticmethod
+    def _index_names(index):
+        # e.g ["b", "a"] or "b,a" to ["a", "b"]
+        names = index if isinstance(index, (list, tuple, set)) else str(index).split(",")
+        return sorted({name.strip() for name in names if name and name.strip()})
+
+    @classmethod
+    def invalidate_cache(cls, *indices):
+        """
+        Drop the cached query results of the indices, it's called by the write methods of the proxy
+        """
+        with cls._generation_lock:
+            for index in indices:
+                for name in cls._index_names(index):
+                    cls._index_generations[name] = cls._index_generations.get(name, 0) + 1
+
+    @classmethod
+    def _cache_key(cls, index, body, source):
+        """
+        Key of a cached result, which changes when any of the indices is written
+
+        Returns:
+            tuple/None: None when the result can't be cached, i.e a wildcard or _all, whose results can't be
+                invalidated by the writes to the concrete indices
+        """
+        names = cls._index_names(index)
+        if not names or any(name == "_all" or "*" in name or "?" in name for name in names):
+            LOGGER.warning("The result of %s is not cached, the index should be concrete.", index)
+            return None
+        text = json.dumps([body, source], sort_keys=True, default=str)
+        generations = tuple(cls._index_generations.get(name, 0) for name in names)
+        return ",".join(names), generations, hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def query(self, index, body, source=True, cache_ttl=None):
         """
         query the index
 
@@ -247,14 +703,27 @@ class ElasticsearchProxy(DataBaseProxy):
             index(str): index of the data
             body(dict): query body
             source(list or bool): list of source
+            cache_ttl(int/None): seconds that the result is cached in the process, it's not cached by default.
+                The cache is invalidated by the writes of this process only, so it's for the queries that can
+                tolerate stale results of cache_ttl, and the cached result must not be modified. The results of
+                wildcards are not cached, and the results read through an alias are not invalidated by the
+                writes to its indices, they are stale until cache_ttl expires
 
         Returns:
             bool: succeed or fail
             list: result of query
         """
+        cache_key = self._cache_key(index, body, source) if cache_ttl else None
+        if cache_key:
+            result = self._result_cache.get(cache_key)
+            if result is not None:
+                return True, result
+
         result = []
         try:
             result = self._es_db.search(index=index, body=body, _source=source)
+            if cache_key:
+                self._result_cache.set(cache_key, result, cache_ttl)
             return True, result
 
         except NotFoundError as error:
@@ -265,6 +734,63 @@ class ElasticsearchProxy(DataBaseProxy):
             LOGGER.error(error)
             return False, result
 
+    def msearch(self, searches, source=True, cache_ttl=None, count=False):
+        """
+        Do several queries in one request
+
+        Args:
+            searches(list): index and body of the queries, e.g [("task", {"query": {...}}), ...]
+            source(list or bool): list of source
+            cache_ttl(int/None): seconds that the results are cached in the process, see query
+            count(bool): count the documents matching the queries instead, like count
+
+        Returns:
+            bool: succeed or fail
+            list: results of the queries in the same order, the result of a failed query is None,
+                and [] when the index is not found like query; the counts when count is True,
+                0 when the index is not found
+        """
+        results = [None] * len(searches)
+        cache_keys = [
+            self._cache_key(index, body, self._COUNT_KEY if count else source) if cache_ttl else None
+            for index, body in searches
+        ]
+        request, pending = [], []
+        for position, (index, body) in enumerate(searches):
+            cached = self._result_cache.get(cache_keys[position]) if cache_keys[position] else None
+            if cached is not None:
+                results[position] = cached
+                continue
+            if count:
+                body = dict(body or {}, size=0, track_total_hits=True)
+            elif source is not True:
+                body = dict(body, _source=source)
+            request.extend(({"index": index}, body))
+            pending.append(position)
+        if not pending:
+            return True, results
+
+        try:
+            responses = self._es_db.msearch(body=request)["responses"]
+        except ElasticsearchException as error:
+            LOGGER.error(error)
+            return False, results
+
+        for position, response in zip(pending, responses):
+            if "error" not in response:
+                if count:
+                    total = response["hits"]["total"]
+                    response = total["value"] if isinstance(total, dict) else total
+                results[position] = response
+                if cache_keys[position]:
+                    self._result_cache.set(cache_keys[position], response, cache_ttl)
+            elif response.get("status") == 404:
+                LOGGER.warning(response["error"])
+                results[position] = 0 if count else []
+            else:
+                LOGGER.error(response["error"])
+        return True, results
+
     def scan(self, index, body, source=True):
         """
         Batch query function
@@ -293,20 +819,215 @@ class ElasticsearchProxy(DataBaseProxy):
             LOGGER.error(error)
             return False, result
 
-    def count(self, index, body):
+    def _clear_scroll(self, scroll_id):
+        try:
+            self._es_db.clear_scroll(body={"scroll_id": scroll_id}, ignore=(404,))
+        except ElasticsearchException as error:
+            LOGGER.warning(error)
+
+    def _start_scroll(self, index, body, source, size, scroll, slice_id=None, slices=None):
+        body = dict(body or {})
+        if slices:
+            body["slice"] = {"id": slice_id, "max": slices}
+        response = self._es_db.search(index=index, body=body, scroll=scroll, size=size, _source=source)
+        return _ScrollPages(self, response, scroll)
+
+    def _sliced_pages(self, index, body, source, size, scroll, slices):
+        """
+        Scroll the slices in parallel threads, the pages of all the slices are yielded as they are fetched
+        """
+        pages, stop, done = queue.Queue(maxsize=slices * 2), threading.Event(), object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scroll_slice(slice_id):
+            try:
+                slice_pages = self._start_scroll(index, body, source, size, scroll, slice_id, slices)
+                try:
+                    for hits in slice_pages:
+                        if not put(hits):
+                            break
+                finally:
+                    slice_pages.close()
+            except NotFoundError as error:
+                LOGGER.warning(error)
+            except Exception as error:  # pylint: disable=W0703
+                # passed to the consumer, which would wait for the slice forever otherwise
+                put(error)
+            finally:
+                put(done)
+
+        executor = ThreadPoolExecutor(max_workers=slices)
+        for slice_id in range(slices):
+            executor.submit(scroll_slice, slice_id)
+        finished = 0
+        try:
+            while finished < slices:
+                item = pages.get()
+                if item is done:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=False)
+
+    def scan_iter(self, index, body, source=True, size=None, scroll=None, slices=None, batch=False):
+        """
+        Scroll all the documents matching the query, the documents are fetched page by page while they are
+        consumed, and the scroll context is cleared when the iterator is exhausted or closed
+
+        Args:
+            index(str): index of the data
+            body(dict): query body
+            source(list or bool): list of source
+            size(int): number of documents fetched by a scroll request, SCROLL_SIZE by default
+            scroll(str): time that the scroll context is kept alive between two requests, e.g "5m"
+            slices(int): scroll the index in slices in parallel threads, the order of the documents is not kept
+            batch(bool): yield the documents page by page instead of one by one
+
+        Returns:
+            bool: succeed or fail
+            iterator: _source of the documents, or lists of them when batch is True;
+                the error of a following scroll request is raised by it
+        """
+        size = size or self.SCROLL_SIZE
+        scroll = scroll or self.SCROLL_KEEP_ALIVE
+        try:
+            if slices and slices > 1:
+                pages = self._sliced_pages(index, body, source, size, scroll, slices)
+            else:
+                pages = self._start_scroll(index, body, source, size, scroll)
+        except NotFoundError as error:
+            LOGGER.warning(error)
+            return True, iter(())
+        except ElasticsearchException as error:
+            LOGGER.error(error)
+            return False, iter(())
+
+        def documents():
+            try:
+                for hits in pages:
+                    if batch:
+                        yield [hit.get("_source") for hit in hits]
+                    else:
+                        for hit in hits:
+                            yield hit.get("_source")
+            finally:
+                pages.close()
+
+        return True, documents()
+
+    def _close_point_in_time(self, pit_id):
+        try:
+            self._es_db.close_point_in_time(body={"id": pit_id}, ignore=(404,))
+        except ElasticsearchException as error:
+            LOGGER.warning(error)
+
+    def search_after(self, index, body, size, cursor=None, source=True, point_in_time=False, keep_alive=None):
+        """
+        Query a page after the page of the cursor by search_after, a deep page is as fast as the first page.
+        The query body should be sorted by a unique field as tie breaker, e.g [{"timestamp": "desc"},
+        {"task_id": "asc"}], it's not needed with point_in_time. Use query with from/size for shallow pages.
+
+        Args:
+            index(str): index of the data
+            body(dict): query body with sort
+            size(int): number of documents in a page
+            cursor(str/None): cursor of the result of the previous page, the first page is queried when it's None
+            source(list or bool): list of source
+            point_in_time(bool): query all the pages in a point in time, so the pages are consistent even
+                if the index is changed, it's opened with the first page and closed with the last page
+            keep_alive(str): time that the point in time is kept alive between two pages, e.g "1m"
+
+        Returns:
+            bool: succeed or fail, it fails when the point in time of the cursor has expired,
+                or the body isn't sorted and point_in_time isn't used
+            dict: result of query, with the cursor of the next page, None when it's the last page, e.g
+                {"hits": {"hits": [...]}, "cursor": "WyJ4eHgiLFsxNzE2MTY3OTY4LDJdXQ"}
+        """
+        keep_alive = keep_alive or self.PIT_KEEP_ALIVE
+        body = dict(body or {}, size=size)
+        pit_id = None
+        try:
+            if cursor:
+                pit_id, search_after = decode_page_cursor(cursor)
+                body["search_after"] = search_after
+            elif point_in_time:
+                pit_id = self._es_db.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+        except ValueError as error:
+            LOGGER.error(error)
+            return False, dict()
+        except NotFoundError as error:
+            # the index doesn't exist
+            LOGGER.warning(error)
+            return True, dict(hits=dict(hits=[]), cursor=None)
+        except ElasticsearchException as error:
+            LOGGER.error(error)
+            return False, dict()
+        if not pit_id and not body.get("sort"):
+            LOGGER.error("The body of search_after should be sorted unless point_in_time is used.")
+            return False, dict()
+
+        try:
+            if pit_id:
+                # the index is set by the point in time
+                body["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+                result = self._es_db.search(body=body, _source=source)
+                pit_id = result.get("pit_id") or pit_id
+            else:
+                result = self._es_db.search(index=index, body=body, _source=source)
+        except NotFoundError as error:
+            if cursor or pit_id:
+                # the point in time has expired or the index is deleted while paging, the pages are incomplete
+                LOGGER.error(error)
+                return False, dict()
+            LOGGER.warning(error)
+            return True, dict(hits=dict(hits=[]), cursor=None)
+        except ElasticsearchException as error:
+            LOGGER.error(error)
+            return False, dict()
+
+        hits = result["hits"]["hits"]
+        if len(hits) < size:
+            result["cursor"] = None
+            if pit_id:
+                self._close_point_in_time(pit_id)
+        else:
+            result["cursor"] = encode_page_cursor([pit_id, hits[-1]["sort"]])
+        return True, result
+
+    def count(self, index, body, cache_ttl=None):
         """
         Get count of index
 
         Args:
             index(str): index of the data
             body(dict): query body
+            cache_ttl(int/None): seconds that the count is cached in the process, see query
 
         Returns:
             bool: succeed or fail
             int: count
         """
+        cache_key = self._cache_key(index, body, self._COUNT_KEY) if cache_ttl else None
+        if cache_key:
+            count = self._result_cache.get(cache_key)
+            if count is not None:
+                return True, count
         try:
             count = self._es_db.count(index=index, body=body).get("count", 0)
+            if cache_key:
+                self._result_cache.set(cache_key, count, cache_ttl)
             return True, count
         except ElasticsearchException as error:
             LOGGER.error(error)
@@ -326,6 +1047,7 @@ class ElasticsearchProxy(DataBaseProxy):
         try:
             if not self._es_db.indices.exists(index):
                 self._es_db.indices.create(index=index, body=body)
+                self.invalidate_cache(index)
         except ElasticsearchException as error:
             LOGGER.error(error)
             LOGGER.error("Create index fail")
@@ -347,6 +1069,7 @@ class ElasticsearchProxy(DataBaseProxy):
         """
         try:
             self._es_db.index(index=index, doc_type=doc_type, body=body, id=document_id)
+            self.invalidate_cache(index)
             return True
         except ElasticsearchException as error:
             LOGGER.error(error)
@@ -372,59 +1095,157 @@ class ElasticsearchProxy(DataBaseProxy):
             LOGGER.error(error)
             return False, None
 
+    def _bulk_option(self, name, value):
+        if value is not None:
+            return value
+        config_value = getattr(configuration.elasticsearch, "bulk_" + name, None)
+        return self.BULK_OPTIONS[name] if config_value is None else config_value
+
+    def _bulk_results(self, actions, chunk_size, max_chunk_bytes, thread_count):
+        """
+        Send the actions and yield the result of every action with the action itself,
+        the results of streaming_bulk and parallel_bulk are in the same order as the actions
+        """
+        sent = deque()
+
+        def track():
+            for action in actions:
+                sent.append(action)
+                yield action
+
+        options = dict(chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes, raise_on_error=False)
+        if thread_count > 1:
+            results = helpers.parallel_bulk(
+                self._es_db, track(), thread_count=thread_count, raise_on_exception=False, **options
+            )
+        else:
+            results = helpers.streaming_bulk(self._es_db, track(), raise_on_exception=False, **options)
+        for succeed, item in results:
+            yield succeed, sent.popleft(), next(iter(item.values()), {})
+
+    def bulk(
+        self,
+        actions,
+        chunk_size=None,
+        max_chunk_bytes=None,
+        thread_count=None,
+        max_retries=None,
+        initial_backoff=None,
+        callback=None,
+        details=False,
+    ):
+        """
+        Do bulk actions, they are consumed and sent chunk by chunk, so a generator of any size can be sent.
+        The documents rejected with 429 by a busy cluster are sent again with exponential backoff.
+
+        Args:
+            actions(iterable): actions of helpers.bulk, e.g {"_index": "task", "_source": {...}}
+            chunk_size(int): number of documents in a request
+            max_chunk_bytes(int): bytes of a request at most
+            thread_count(int): number of threads sending the requests, parallel_bulk is used when it's more than 1
+            max_retries(int): times that a rejected document is sent again
+            initial_backoff(float): seconds to wait before the first retry, it's doubled for every retry
+            callback(callable): called with the result of every document, callback(succeed, action, result)
+            details(bool): report the ids of the succeed documents too, they are kept in memory
+
+        Returns:
+            bool: all the documents succeed or not
+            list: failed documents, e.g [{"action": {...}, "status": 400, "error": {...}}]
+            list: ids of the succeed documents, it's returned only when details is True
+        """
+        chunk_size = self._bulk_option("chunk_size", chunk_size)
+        max_chunk_bytes = self._bulk_option("max_chunk_bytes", max_chunk_bytes)
+        thread_count = self._bulk_option("thread_count", thread_count)
+        max_retries = self._bulk_option("max_retries", max_retries)
+        initial_backoff = self._bulk_option("initial_backoff", initial_backoff)
+
+        fail_list, succeed_ids, indices = [], [], set()
+
+        def report(succeed):
+            return (succeed, fail_list, succeed_ids) if details else (succeed, fail_list)
+
+        def collect_indices(actions):
+            for action in actions:
+                indices.add(action.get("_index"))
+                yield action
+
+        for attempt in range(max_retries + 1):
+            rejected = []
+            try:
+                results = self._bulk_results(collect_indices(actions), chunk_size, max_chunk_bytes, thread_count)
+                for succeed, action, result in results:
+                    if not succeed and result.get("status") == 429 and attempt < max_retries:
+                        rejected.append(action)
+                        continue
+                    if callback:
+                        callback(succeed, action, result)
+                    if not succeed:
+                        fail_list.append(dict(action=action, status=result.get("status"), error=result.get("error")))
+                    elif details:
+                        succeed_ids.append(result.get("_id"))
+            except ElasticsearchException as error:
+                LOGGER.error(error)
+                self.invalidate_cache(*indices)
+                return report(False)
+            if not rejected:
+                break
+            time.sleep(min(initial_backoff * 2**attempt, self.MAX_BACKOFF))
+            actions = rejected
+
+        self.invalidate_cache(*indices)
+        if fail_list:
+            LOGGER.error("%d documents failed in bulk, e.g %s", len(fail_list), fail_list[0]["error"])
+        return report(not fail_list)
+
     def _bulk(self, action):
         """
         Do bulk action
 
         Args:
-            action(list): actions
+            action(iterable): actions
 
         Returns:
             bool
         """
-        try:
-            if action:
-                helpers.bulk(self._es_db, action)
-            return True
-        except ElasticsearchException as error:
-            LOGGER.error(error)
-            return False
+        succeed, _ = self.bulk(action)
+        return succeed
 
-    def insert_bulk(self, index, data):
+    def insert_bulk(self, index, data, details=False, **options):
         """
         Insert batch data into es
 
         Args:
             index(str): index of the data
-            data(list): batch data
+            data(iterable): batch data, it can be a generator
+            details(bool): return the results of bulk instead of a bool
+            options(dict): options of bulk, e.g chunk_size, thread_count
 
         Returns:
             bool: succeed or fail
+            tuple: succeed, failed documents and ids of the inserted documents when details is True
         """
-        action = []
-        for item in data:
-            action.append({"_index": index, "_source": item})
-
-        return self._bulk(action)
+        results = self.bulk(({"_index": index, "_source": item} for item in data), details=details, **options)
+        return results if details else results[0]
 
-    def update_bulk(self, index, data):
+    def update_bulk(self, index, data, details=False, **options):
         """
         Update batch data
 
         Args:
             index(str): index of the data
-            data(list): batch data
+            data(iterable): batch data, e.g [{"_id": "xxx", "doc": {...}}], it can be a generator
+            details(bool): return the results of bulk instead of a bool
+            options(dict): options of bulk, e.g chunk_size, thread_count
 
         Returns:
             bool: succeed or fail
+            tuple: succeed, failed documents and ids of the updated documents when details is True
         """
-        action = []
-        for item in data:
-            _id = item.get("_id")
-            doc = item.get("doc")
-            action.append({"_op_type": "update", "_index": index, "_id": _id, "doc": doc})
-
-        return self._bulk(action)
+        actions = (
+            {"_op_type": "update", "_index": index, "_id": item.get("_id"), "doc": item.get("doc")} for item in data
+        )
+        results = self.bulk(actions, details=details, **options)
+        return results if details else results[0]
 
     def delete(self, index, body):
         """
@@ -440,6 +1261,7 @@ class ElasticsearchProxy(DataBaseProxy):
 
         try:
             self._es_db.delete_by_query(index=index, body=body)
+            self.invalidate_cache(index)
             return True
         except ElasticsearchException as error:
             LOGGER.error(str(error))
@@ -457,6 +1279,7 @@ class ElasticsearchProxy(DataBaseProxy):
         """
         try:
             self._es_db.indices.delete(index)
+            self.invalidate_cache(index)
             return True
         except TransportError:
             LOGGER.error("delete es index %s fail", index)
@@ -526,6 +1349,11 @@ class PromDbProxy(DataBaseProxy):
     Proxy of prometheus time series database
     """
 
+    # url encoded length of a query at most, the hosts of query_many are split into several queries beyond it
+    MAX_QUERY_LENGTH = 4000
+    # number of queries sent at the same time by query_many
+    MAX_WORKERS = 8
+
     def __init__(self, host=None, port=None):
         """
         Init Prometheus time series database proxy
@@ -555,7 +1383,7 @@ class PromDbProxy(DataBaseProxy):
             LOGGER.error(error)
         return connected
 
-    def query(self, host, time_range, metric, label_config=None):
+    def query(self, host, time_range, metric, label_config=None, columnar=False):
         """
         query a metric's data of a host during a time range
         Args:
@@ -563,6 +1391,7 @@ class PromDbProxy(DataBaseProxy):
             time_range (list): list of datetime.datetime
             metric (str): data type of prometheus
             label_config (dict): label config of metric
+            columnar (bool): return the series in columnar format, see to_columnar
 
         Returns:
             tuple: (bool, dict)
@@ -578,11 +1407,7 @@ class PromDbProxy(DataBaseProxy):
         metric_with_condition = metric + combined_condition
 
         try:
-            data = self._prom.get_metric_range_data(
-                metric_name=metric_with_condition,
-                start_time=start_time,
-                end_time=end_time,
-            )
+            data = self._query_range(metric_with_condition, start_time, end_time, columnar)
 
             if not data:
                 LOGGER.warning(
@@ -604,6 +1429,119 @@ class PromDbProxy(DataBaseProxy):
             }
             return False, [failed_item]
 
+    @staticmethod
+    def _host_pattern(host):
+        return "%s:\\\\d{1,5}" % host
+
+    @classmethod
+    def _split_hosts(cls, hosts, metric, label_config, max_length):
+        """
+        Split the hosts into groups, the query of a group is within max_length after url encoded
+        """
+        base_length = len(quote(cls._batch_selector([], metric, label_config), safe=""))
+        separator_length = len(quote("|", safe=""))
+        groups, group, length = [], [], base_length
+        for host in hosts:
+            host_length = len(quote(cls._host_pattern(host), safe=""))
+            if group and length + separator_length + host_length > max_length:
+                groups.append(group)
+                group, length = [], base_length
+            length += host_length + (separator_length if group else 0)
+            group.append(host)
+        if group:
+            groups.append(group)
+        return groups
+
+    @classmethod
+    def _batch_selector(cls, hosts, metric, label_config):
+        host_condition = 'instance=~"%s"' % "|".join(cls._host_pattern(host) for host in hosts)
+        return metric + cls._combine_condition(label_config, host_condition)
+
+    def _query_range(self, selector, start_time, end_time, columnar=False):
+        data = self._prom.get_metric_range_data(metric_name=selector, start_time=start_time, end_time=end_time)
+        return self.to_columnar(data) if columnar else data
+
+    @staticmethod
+    def to_columnar(data):
+        """
+        Convert the series of a range query to columnar format, the [timestamp, "value"] pairs of a series
+        are parsed into two float64 arrays at once, "NaN" and "+Inf" included
+
+        Args:
+            data (list): series returned by prometheus, e.g [{"metric": {...}, "values": [[1700000000, "1"]]}]
+
+        Returns:
+            list: e.g [{"metric": {...}, "timestamps": array([1.7e+09]), "values": array([1.])}]
+
+        Raises:
+            DatabaseError: numpy is not installed
+        """
+        if np is None:
+            raise DatabaseError("numpy is required by the columnar format of prometheus data.")
+        result = []
+        for series in data or []:
+            values = series.get("values")
+            if values is None:
+                values = [series["value"]] if "value" in series else []
+            columns = np.array(values, dtype=np.float64).reshape(-1, 2).T.copy()
+            result.append({"metric": series.get("metric", {}), "timestamps": columns[0], "values": columns[1]})
+        return result
+
+    def query_many(self, hosts, time_range, metrics, label_config=None, max_workers=None, columnar=False):
+        """
+        Query the data of several metrics of several hosts during a time range, the hosts are queried by one
+        selector per metric e.g up{instance=~"host1:\\\\d{1,5}|host2:\\\\d{1,5}"}, which is split when it's too long
+        for the url, and the queries are sent concurrently
+
+        Args:
+            hosts (list): host ips
+            time_range (list): start and end timestamp
+            metrics (list): data types of prometheus
+            label_config (dict): label config of the metrics
+            max_workers (int): number of queries sent at the same time
+            columnar (bool): return the series in columnar format, see to_columnar
+
+        Returns:
+            bool: all the queries succeed or not
+            dict: data of the hosts, e.g {"host1": {"up": [{"metric": {...}, "values": [...]}]}},
+                the data of a metric is [] when it's not recorded and None when the query failed
+        """
+        start_time = datetime.fromtimestamp(time_range[0])
+        end_time = datetime.fromtimestamp(time_range[1])
+        prometheus_config = configuration.prometheus
+        max_length = getattr(prometheus_config, "max_query_length", None) or self.MAX_QUERY_LENGTH
+        max_workers = max_workers or getattr(prometheus_config, "max_workers", None) or self.MAX_WORKERS
+
+        hosts = list(dict.fromkeys(hosts))
+        result = {host: {metric: [] for metric in metrics} for host in hosts}
+        queries = [
+            (metric, group)
+            for metric in metrics
+            for group in self._split_hosts(hosts, metric, label_config, max_length)
+        ]
+        succeed = True
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries) or 1)) as executor:
+            futures = [
+                executor.submit(
+                    self._query_range, self._batch_selector(group, metric, label_config), start_time, end_time, columnar
+                )
+                for metric, group in queries
+            ]
+            for (metric, group), future in zip(queries, futures):
+                try:
+                    data = future.result()
+                except (ValueError, TypeError, ConnectionError, PrometheusApiClientException) as error:
+                    LOGGER.error("Prometheus query of metric %s failed. %s", metric, error)
+                    succeed = False
+                    for host in group:
+                        result[host][metric] = None
+                    continue
+                for series in data or []:
+                    host = series.get("metric", {}).get("instance", "").rsplit(":", 1)[0]
+                    if host in result:
+                        result[host][metric].append(series)
+        return succeed, result
+
     @staticmethod
     def _combine_condition(label_config, *args):
         """
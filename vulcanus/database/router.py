@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description: route the reads of mysql to the read replicas
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from vulcanus.log.log import LOGGER
+
+__all__ = ("ReplicaRouter", "RoutingSession", "mark_written", "mysql_replica_lag", "read_from_replica")
+
+_READ_BIND = "vulcanus_read_bind"
+_WRITTEN = "vulcanus_written"
+# seconds between two warnings of a replica whose status can't be read, e.g the user has no REPLICATION CLIENT
+_LAG_WARNING_INTERVAL = 300
+_lag_warnings = dict()
+
+
+class RoutingSession(Session):
+    """
+    Session that executes the queries in read_from_replica on the chosen replica, everything else including
+    the flush of the objects read from the replica is executed on the primary bound to the session
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self.info.get(_READ_BIND)
+        if replica is not None and not self._flushing:
+            return replica
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+def mark_written(session, *args):
+    """
+    Mark that the session has written to the primary, its following reads are not routed to the replicas,
+    so they can read what it wrote
+    """
+    session.info[_WRITTEN] = True
+
+
+def _mark_bulk_written(context):
+    mark_written(context.session)
+
+
+event.listen(RoutingSession, "after_flush", mark_written)
+event.listen(RoutingSession, "after_bulk_update", _mark_bulk_written)
+event.listen(RoutingSession, "after_bulk_delete", _mark_bulk_written)
+
+
+@contextmanager
+def read_from_replica(session, router):
+    """
+    Route the queries executed in the context to a replica chosen by the router, they stay on the primary
+    when there is no healthy replica, or when the session has written or has changes to flush
+
+    Args:
+        session(RoutingSession): session bound to the primary
+        router(ReplicaRouter/None): router of the replicas
+
+    Yields:
+        Engine/None: the chosen replica
+    """
+    replica = None
+    if router is not None and isinstance(session, RoutingSession) and not session.info.get(_WRITTEN):
+        if not (session.new or session.dirty or session.deleted):
+            replica = router.choose()
+    previous = session.info.get(_READ_BIND)
+    session.info[_READ_BIND] = replica
+    try:
+        yield replica
+    finally:
+        session.info[_READ_BIND] = previous
+
+
+def mysql_replica_lag(engine):
+    """
+    Seconds that the replica is behind the primary
+
+    Returns:
+        float/None: None when the replication is not running or its status can't be read,
+            the latter is warned once in a while for every replica
+    """
+    last_error = None
+    with engine.connect() as connection:
+        # SHOW REPLICA STATUS is supported since mysql 8.0.22
+        for statement in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+            try:
+                result = connection.execute(text(statement))
+            except SQLAlchemyError as error:
+                last_error = error
+                continue
+            row = result.first()
+            if row is None:
+                return None
+            status = dict(zip(result.keys(), row))
+            lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+            return None if lag is None else float(lag)
+    replica = str(engine.url)
+    now = time.monotonic()
+    if now - _lag_warnings.get(replica, -_LAG_WARNING_INTERVAL) >= _LAG_WARNING_INTERVAL:
+        _lag_warnings[replica] = now
+        LOGGER.warning("Failed to read the replication status of replica %s, %s", replica, last_error)
+    return None
+
+
+class ReplicaRouter:
+    """
+    Choose a replica for the reads, in turn or the one with the least checked out connections,
+    the replica lagging behind the primary more than max_lag is skipped
+    """
+
+    STRATEGIES = ("round_robin", "least_connections")
+
+    def __init__(self, engines, strategy="round_robin", max_lag=None, lag_check_interval=5, lag_probe=None):
+        """
+        Args:
+            engines(list): engines of the replicas
+            strategy(str): round_robin or least_connections
+            max_lag(float): seconds that a replica can lag behind, the lag is not checked when it's None
+            lag_check_interval(float): seconds between two checks of the lag of a replica
+            lag_probe(callable): get the lag of a replica engine, mysql_replica_lag by default
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown replica strategy {strategy}")
+        self.engines = list(engines)
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.lag_probe = lag_probe or mysql_replica_lag
+        # engine: [lag, monotonic time of the check]
+        self._lags = {engine: [None, float("-inf")] for engine in self.engines}
+        self._probe_locks = {engine: threading.Lock() for engine in self.engines}
+        self._counter = itertools.count()
+
+    def _lag(self, engine):
+        state = self._lags[engine]
+        if time.monotonic() - state[1] < self.lag_check_interval:
+            return state[0]
+        # only one thread checks the lag of a replica, the others use the last one instead of waiting for it
+        lock = self._probe_locks[engine]
+        if not lock.acquire(blocking=False):
+            return state[0]
+        try:
+            if time.monotonic() - state[1] < self.lag_check_interval:
+                return state[0]
+            try:
+                state[0] = self.lag_probe(engine)
+            except SQLAlchemyError as error:
+                LOGGER.warning("Failed to get the lag of replica %s, %s", engine.url, error)
+                state[0] = None
+            state[1] = time.monotonic()
+        finally:
+            lock.release()
+        return state[0]
+
+    def healthy_replicas(self):
+        """
+        Replicas whose lag is known and within max_lag
+        """
+        if self.max_lag is None:
+            return self.engines
+        replicas = []
+        for engine in self.engines:
+            lag = self._lag(engine)
+            if lag is not None and lag <= self.max_lag:
+                replicas.append(engine)
+        return replicas
+
+    @staticmethod
+    def _checked_out(engine):
+        pool = engine.pool
+        return pool.checkedout() if isinstance(pool, QueuePool) else 0
+
+    def choose(self):
+        """
+        Choose a replica for the reads
+
+        Returns:
+            Engine/None: None when no replica is healthy, the reads should go to the primary
+        """
+        replicas = self.healthy_replicas()
+        if not replicas:
+            return None
+        if self.strategy == "least_connections":
+            return min(replicas, key=self._checked_out)
+        return replicas[next(self._counter) % len(replicas)]
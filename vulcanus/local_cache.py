@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description: in-process cache with ttl and lru eviction
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from vulcanus.log.log import LOGGER
+
+__all__ = ("InvalidationListener", "LocalCache")
+
+
+class LocalCache:
+    """
+    Thread-safe in-process cache, every entry expires after its ttl and the least recently
+    used entry is evicted when the cache is full.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=1024, ttl=60):
+        """
+        Args:
+            maxsize(int): maximum number of entries
+            ttl(int/float): default time to live of an entry in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, self._MISSING) is not self._MISSING
+
+    def get(self, key, default=None):
+        """
+        Get the value of a key, an expired entry is treated as a miss
+
+        Args:
+            key(hashable): key of the entry
+            default: value returned when the key is missing or expired
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expire_at = item
+            if expire_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Set the value of a key
+
+        Args:
+            key(hashable): key of the entry
+            value: value of the entry
+            ttl(int/float): time to live in seconds, the default ttl of the cache is used when it's None
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """
+        Remove a key and return its value
+        """
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def remove_if(self, predicate):
+        """
+        Remove all the entries whose value matches the predicate
+
+        Args:
+            predicate(callable): called with the value of every entry
+
+        Returns:
+            int: number of removed entries
+        """
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def stats(self):
+        """
+        Hit, miss and eviction counters of the cache
+
+        Returns:
+            dict
+        """
+        return dict(size=len(self._data), hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+
+class InvalidationListener:
+    """
+    Listen to the invalidation of redis keys in a daemon thread, which is started once per process.
+    A key is invalidated when it's published to the channel, or when it's written, deleted or expired
+    in redis, which is notified by the keyspace events of redis.
+    """
+
+    RECONNECT_INTERVAL = 5
+
+    def __init__(self, channel, keyspace_patterns, on_invalidate, on_reset):
+        """
+        Args:
+            channel(str): channel that the invalidated keys are published to
+            keyspace_patterns(tuple): patterns of the keyspace event channels, e.g ("__keyspace@*__:token-*",)
+            on_invalidate(callable): called with the invalidated key
+            on_reset(callable): called when notifications may be lost, all the cached keys should be dropped
+        """
+        self.channel = channel
+        self.keyspace_patterns = keyspace_patterns
+        self.on_invalidate = on_invalidate
+        self.on_reset = on_reset
+        self._lock = threading.Lock()
+        # pid of the process whose listener is subscribed, it's reset as soon as the subscription is lost
+        self._pid = None
+        self._retry_at = 0
+
+    def _subscribe(self, redis_client):
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        pubsub.psubscribe(*self.keyspace_patterns)
+        return pubsub
+
+    def ensure_started(self, redis_client):
+        """
+        Start the listener if it's not running in this process, a lost subscription is retried
+        once per RECONNECT_INTERVAL
+
+        Returns:
+            bool: whether the listener is running, nothing should be cached when it's False
+        """
+        if self._pid == os.getpid():
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        with self._lock:
+            if self._pid == os.getpid():
+                return True
+            try:
+                pubsub = self._subscribe(redis_client)
+            except RedisError as error:
+                LOGGER.warning("Failed to listen to the invalidation of %s, %s", self.channel, error)
+                self._retry_at = time.monotonic() + self.RECONNECT_INTERVAL
+                return False
+            self._pid = os.getpid()
+            threading.Thread(target=self._listen, args=(pubsub,), daemon=True).start()
+        return True
+
+    def _listen(self, pubsub):
+        try:
+            for message in pubsub.listen():
+                self.on_message(message)
+        except RedisError as error:
+            LOGGER.warning("Listener of %s disconnected, %s", self.channel, error)
+        finally:
+            with self._lock:
+                self._pid = None
+                self._retry_at = time.monotonic() + self.RECONNECT_INTERVAL
+            try:
+                pubsub.close()
+            except RedisError:
+                pass
+            # notifications may be lost while disconnected, the keys cached before are dropped
+            self.on_reset()
+
+    def on_message(self, message):
+        if message.get("type") not in ("message", "pmessage"):
+            return
+        key = message["channel"] if message["type"] == "pmessage" else message["data"]
+        if isinstance(key, bytes):
+            key = key.decode("utf-8")
+        # the channel of keyspace event is like __keyspace@0__:token-admin-vulcanus
+        if message["type"] == "pmessage":
+            key = key.split(":", 1)[-1]
+        self.on_invalidate(key)
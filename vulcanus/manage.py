@@ -13,8 +13,14 @@
 from flask import Flask
 from flask.blueprints import Blueprint
 from flask_restful import Api
-from vulcanus.database.helper import create_database_engine, make_mysql_engine_url
-from vulcanus.database.proxy import MysqlProxy, RedisProxy
+from vulcanus.database.helper import (
+    create_database_engine,
+    make_mysql_engine_options,
+    make_mysql_engine_url,
+    make_mysql_replica_urls,
+)
+from vulcanus.database.proxy import MysqlProxy, RedisProxy, remove_session
+from vulcanus.database.router import ReplicaRouter
 from vulcanus.conf import configuration
 
 
@@ -26,11 +32,25 @@ def _register_blue_point(urls):
 
 
 def _set_database_engine(settings):
+    options = make_mysql_engine_options(settings)
     engine = create_database_engine(
-        make_mysql_engine_url(settings), settings.mysql.pool_size, settings.mysql.pool_recycle
+        make_mysql_engine_url(settings), settings.mysql.pool_size, settings.mysql.pool_recycle, **options
     )
     setattr(MysqlProxy, "engine", engine)
 
+    replica_engines = [
+        create_database_engine(url, settings.mysql.pool_size, settings.mysql.pool_recycle, **options)
+        for url in make_mysql_replica_urls(settings)
+    ]
+    if replica_engines:
+        replica_router = ReplicaRouter(
+            replica_engines,
+            strategy=settings.mysql.replica_strategy or "round_robin",
+            max_lag=settings.mysql.replica_max_lag,
+            lag_check_interval=settings.mysql.replica_lag_check_interval or 5,
+        )
+        setattr(MysqlProxy, "replica_router", replica_router)
+
 
 def init_application(name: str, settings, register_urls: list = None, config: dict = None, template: str = None):
     """
@@ -72,6 +92,7 @@ def init_application(name: str, settings, register_urls: list = None, config: di
 
     # sync service config
     _set_database_engine(settings)
+    app.teardown_appcontext(remove_session)
     for config in [config for config in dir(settings) if not config.startswith("_")]:
         setattr(configuration, config, getattr(settings, config))
 
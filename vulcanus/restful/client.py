@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description: pooled http client used for the requests between services
+"""
+import asyncio
+import json
+import threading
+import time
+from functools import partial
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from vulcanus.conf import configuration
+from vulcanus.conf.constant import TIMEOUT
+from vulcanus.log.log import LOGGER
+from vulcanus.restful.resp import make_response, state
+
+__all__ = ("HttpClient", "AsyncHttpClient", "RETRY_STATUS_CODES")
+
+RETRY_STATUS_CODES = (500, 502, 503, 429, 408)
+
+
+class HttpClient:
+    """
+    Process-wide http client, the connections of every host are kept alive in a pool and
+    reused by the following requests, so a request between services does not need a new
+    tcp/tls handshake. The client is shared by all the worker threads.
+    """
+
+    _lock = threading.Lock()
+    _instance = None
+
+    DEFAULT_POOL_CONNECTIONS = 50
+    DEFAULT_POOL_MAXSIZE = 20
+    DEFAULT_IDLE_TIMEOUT = 300
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, idle_timeout=None):
+        """
+        Args:
+            pool_connections(int): number of host pools to cache, the least recently used one is discarded
+            pool_maxsize(int): maximum number of connections kept alive in the pool of one host
+            idle_timeout(int): seconds without any request after which all the pooled connections are closed
+        """
+        http_config = configuration.http_client
+        self.pool_connections = (
+            pool_connections or getattr(http_config, "pool_connections", None) or self.DEFAULT_POOL_CONNECTIONS
+        )
+        self.pool_maxsize = pool_maxsize or getattr(http_config, "pool_maxsize", None) or self.DEFAULT_POOL_MAXSIZE
+        self.idle_timeout = idle_timeout or getattr(http_config, "idle_timeout", None) or self.DEFAULT_IDLE_TIMEOUT
+        self._session = None
+        self._adapter = None
+        self._last_used = 0
+        self._session_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """
+        Get the client shared by the process
+
+        Returns:
+            HttpClient
+        """
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def _create_session(self):
+        session = requests.Session()
+        # the session is shared by requests of different users, never keep the cookies
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self._adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount("http://", self._adapter)
+        session.mount("https://", self._adapter)
+        self._session = session
+
+    @property
+    def session(self):
+        """
+        Get the pooled session, the connections left idle longer than idle_timeout are closed first
+
+        Returns:
+            requests.Session
+        """
+        with self._session_lock:
+            now = time.monotonic()
+            if self._session is None:
+                self._create_session()
+            elif now - self._last_used > self.idle_timeout:
+                self._adapter.poolmanager.clear()
+            self._last_used = now
+            return self._session
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the connection pool, the arguments are the same as requests.request
+
+        Returns:
+            requests.Response
+        """
+        return self.session.request(method=method, url=url, **kwargs)
+
+    def close(self):
+        """
+        Close all the pooled connections
+        """
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._adapter = None
+
+
+class _RetryableStatus(Exception):
+    pass
+
+
+_RETRY_EXCEPTIONS = (_RetryableStatus, asyncio.TimeoutError, OSError, requests.exceptions.RequestException)
+if aiohttp is not None:
+    _RETRY_EXCEPTIONS += (aiohttp.ClientError,)
+
+
+class AsyncHttpClient:
+    """
+    Send a batch of requests concurrently in one event loop, the result of every request has the
+    same format as BaseResponse.get_response. aiohttp is used when it is installed, otherwise the
+    requests are sent by the pooled HttpClient in the default executor of the loop.
+    """
+
+    MAX_ATTEMPT_NUMBER = 3
+    WAIT_EXPONENTIAL_MULTIPLIER = 1
+    WAIT_EXPONENTIAL_MAX = 5
+
+    def __init__(self, concurrency=50, timeout=TIMEOUT):
+        """
+        Args:
+            concurrency(int): maximum number of requests in flight at the same time
+            timeout(int): default timeout in seconds of every request
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    @classmethod
+    def _wait_time(cls, attempt_number):
+        # same backoff as the retrying decorator used by BaseResponse.get_response
+        return min(cls.WAIT_EXPONENTIAL_MULTIPLIER * 2**attempt_number, cls.WAIT_EXPONENTIAL_MAX)
+
+    @staticmethod
+    async def _aiohttp_send(session, method, url, data, header, timeout):
+        async with session.request(
+            method, url, json=data, headers=header, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            return response.status, await response.text()
+
+    @staticmethod
+    async def _executor_send(session, method, url, data, header, timeout):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            None, partial(HttpClient.instance().request, method, url, json=data, headers=header, timeout=timeout)
+        )
+        return response.status_code, response.text
+
+    async def _request(self, send, session, semaphore, method, url, data=None, header=None, timeout=None):
+        if data and not isinstance(data, dict):
+            LOGGER.error("The param format of rest is not dict")
+            return make_response(label=state.PARAM_ERROR)
+
+        timeout = timeout or self.timeout
+        for attempt_number in range(1, self.MAX_ATTEMPT_NUMBER + 1):
+            try:
+                async with semaphore:
+                    status_code, text = await asyncio.wait_for(
+                        send(session, method, url, data, header, timeout), timeout
+                    )
+                if status_code in RETRY_STATUS_CODES:
+                    raise _RetryableStatus("%s %s responded with status code %s" % (method, url, status_code))
+                if 200 <= status_code < 300:
+                    return json.loads(text)
+                return make_response(label=state.HTTP_CONNECT_ERROR, message=text)
+            except ValueError as error:
+                LOGGER.error(error)
+                break
+            except _RETRY_EXCEPTIONS as error:
+                if attempt_number == self.MAX_ATTEMPT_NUMBER:
+                    LOGGER.error(error)
+                    break
+                await asyncio.sleep(self._wait_time(attempt_number))
+
+        return make_response(label=state.HTTP_CONNECT_ERROR)
+
+    async def request_all(self, requests_params):
+        """
+        Send all the requests concurrently
+
+        Args:
+            requests_params(list): parameters of every request, e.g
+                [{"method": "GET", "url": "http://127.0.0.1:11111/hosts", "data": {}, "header": {}, "timeout": 30}]
+
+        Returns:
+            list: response body of every request, in the same order as requests_params
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        if aiohttp is None:
+            return await asyncio.gather(
+                *[self._request(self._executor_send, None, semaphore, **params) for params in requests_params]
+            )
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar()) as session:
+            return await asyncio.gather(
+                *[self._request(self._aiohttp_send, session, semaphore, **params) for params in requests_params]
+            )
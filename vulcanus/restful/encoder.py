@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description: json encoder of the response body
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date
+from functools import lru_cache
+
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+from vulcanus.conf import configuration
+from vulcanus.log.log import LOGGER
+from vulcanus.restful.resp import Response
+
+__all__ = ("ResponseEncoder", "json_default", "response_encoder")
+
+
+def json_default(obj):
+    """
+    Serialize the types json doesn't support, the result is the same as the default json provider of flask
+    except that sqlalchemy Row is also supported
+    """
+    if isinstance(obj, date):
+        return http_date(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    # named tuples are arrays as in the json of the standard library, orjson passes tuple subclasses here
+    if isinstance(obj, tuple):
+        return list(obj)
+    # sqlalchemy Row
+    if hasattr(obj, "_mapping"):
+        return dict(obj._mapping)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+@lru_cache(maxsize=None)
+def _label_fragment(label):
+    code = Response.xml.table.get(label)
+    if code is None:
+        raise ValueError("An incorrect code value was passed")
+    return ('"code":%s,"label":%s' % (json.dumps(code.status_code), json.dumps(label))).encode()
+
+
+class ResponseEncoder:
+    """
+    Serialize the response body into json bytes, orjson or ujson is used when it's installed,
+    otherwise the json of the standard library is used.
+    """
+
+    BACKENDS = ("orjson", "ujson", "json")
+
+    def __init__(self, backend=None, sort_keys=True):
+        """
+        Args:
+            backend(str): orjson, ujson, json or auto, the fastest installed backend is chosen by auto
+            sort_keys(bool): sort the keys of the dicts, the default json provider of flask sorts them
+        """
+        backend = backend or getattr(configuration.response_encoder, "backend", None) or "auto"
+        installed = dict(orjson=orjson, ujson=ujson, json=json)
+        if backend not in self.BACKENDS:
+            backend = next(name for name in self.BACKENDS if installed[name])
+        elif not installed[backend]:
+            LOGGER.warning("Json backend %s is not installed, the json of the standard library is used", backend)
+            backend = "json"
+        self.backend = backend
+        self.sort_keys = sort_keys
+        self._orjson_option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+        if orjson and sort_keys:
+            self._orjson_option |= orjson.OPT_SORT_KEYS
+
+    def _json_dumps(self, obj):
+        return json.dumps(
+            obj, default=json_default, sort_keys=self.sort_keys, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+    def dumps(self, obj):
+        """
+        Serialize obj into json
+
+        Returns:
+            bytes
+        """
+        try:
+            if self.backend == "orjson":
+                return orjson.dumps(obj, default=json_default, option=self._orjson_option)
+            if self.backend == "ujson":
+                return ujson.dumps(obj, default=json_default, sort_keys=self.sort_keys, ensure_ascii=False).encode()
+        except (TypeError, OverflowError):
+            # e.g. integers beyond 64 bits, which only the standard library supports
+            pass
+        return self._json_dumps(obj)
+
+    def iter_encode(self, label, message=None, data=None, chunk_size=500):
+        """
+        Serialize the response body incrementally, the items of data are serialized chunk by chunk,
+        so a large list or a generator of records is never held as a whole json document
+
+        Args:
+            label(str): label of the response code
+            message(str): custom message
+            data(iterable): items of the data array
+            chunk_size(int): number of items serialized in one chunk
+
+        Yields:
+            bytes: part of the response body
+        """
+        fragment = _label_fragment(label)
+        if message is None:
+            message = Response.xml.table[label].message_en
+        yield b"{" + fragment + b',"message":' + self.dumps(message) + b',"data":['
+
+        separator = b""
+        chunk = []
+        for item in data or ():
+            chunk.append(self.dumps(item))
+            if len(chunk) >= chunk_size:
+                yield separator + b",".join(chunk)
+                separator = b","
+                chunk = []
+        if chunk:
+            yield separator + b",".join(chunk)
+        yield b"]}"
+
+
+response_encoder = ResponseEncoder()
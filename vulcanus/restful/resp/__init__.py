@@ -34,5 +34,13 @@ def make_response(label: str, message: str = None, data=None):
             "data":
         }
     """
-    response = Response(label=state.SUCCEED)
-    return response.body(label=label, zh=False, message=message, data=data)
+    code = Response.xml.table.get(label)
+    if code is None:
+        raise ValueError("An incorrect code value was passed")
+
+    body = dict(message=code.message_en if message is None else message)
+    if data is not None:
+        body["data"] = data
+    body["code"] = code.status_code
+    body["label"] = label
+    return body
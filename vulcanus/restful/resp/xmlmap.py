@@ -12,6 +12,8 @@
 # ******************************************************************************/
 import os
 import threading
+from collections import namedtuple
+from types import MappingProxyType
 
 try:
     import xml.etree.cElementTree as et
@@ -19,6 +21,9 @@ except ImportError:
     import xml.etree.ElementTree as et
 
 
+ResponseCode = namedtuple("ResponseCode", ("status_code", "message_en", "message_zh"))
+
+
 class XmlParse:
     """
     Parse the default response body file and return the request response in a uniform manner
@@ -34,6 +39,7 @@ class XmlParse:
 
     def __init__(self):
         self.xml = None
+        self._table = None
 
     def _load_xml(self, xml_path):
         """
@@ -54,6 +60,7 @@ class XmlParse:
 
     def clear_xml(self):
         self.xml = None
+        self._table = None
 
     @property
     def root(self):
@@ -62,14 +69,35 @@ class XmlParse:
     def _todict(self, tag):
         return {child.tag: child.text for child in tag.findall("*")}
 
+    @property
+    def table(self):
+        """
+        Response codes compiled from map.xml, it's loaded only once
+
+        Returns:
+            MappingProxyType: e.g {"Succeed": ResponseCode(status_code="200", message_en="operation succeed")}
+        """
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    if not self.xml:
+                        self._load_xml("map.xml")
+                    table = dict()
+                    for tag in self.root.findall("./code"):
+                        # the first code of a duplicate label takes effect
+                        table.setdefault(
+                            tag.get("label"),
+                            ResponseCode(tag.findtext("status_code"), tag.findtext("message_en"), tag.findtext("message_zh")),
+                        )
+                    self._table = MappingProxyType(table)
+        return self._table
+
     def content(self, label):
-        if not self.xml:
-            self._load_xml("map.xml")
-        tag = self.root.find("./code/[@label='%s']" % label)
-        if tag is None:
-            return tag
+        code = self.table.get(label)
+        if code is None:
+            return code
 
-        return self._todict(tag)
+        return {key: value for key, value in code._asdict().items() if value is not None}
 
 
 class Response:
@@ -84,12 +112,11 @@ class Response:
         self.response_body = dict(message=message)
 
     def _response_content(self, label):
-        body = Response.xml.content(label)
-        if not body:
+        code = Response.xml.table.get(label)
+        if code is None:
             raise ValueError("An incorrect code value was passed")
 
-        body["label"] = label
-        return body
+        return dict(code._asdict(), label=label)
 
     @property
     def response(self):
@@ -10,15 +10,15 @@
 # PURPOSE.
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
-import ast
+import asyncio
 import json
 import os
 import uuid
 from functools import wraps
-from urllib.parse import unquote
 
 import requests
-from flask import g, jsonify, request
+from flask import Response as FlaskResponse
+from flask import g, request, stream_with_context
 from flask_restful import Resource
 from jwt.exceptions import ExpiredSignatureError
 from retrying import retry
@@ -28,11 +28,42 @@ from vulcanus.conf import configuration
 from vulcanus.conf.constant import ADMIN_USER, TIMEOUT, UserRoleType
 from vulcanus.database.proxy import MysqlProxy, RedisProxy
 from vulcanus.exceptions import DatabaseConnectionFailed
+from vulcanus.local_cache import LocalCache
 from vulcanus.log.log import LOGGER
+from vulcanus.restful.client import RETRY_STATUS_CODES, AsyncHttpClient, HttpClient
+from vulcanus.restful.encoder import response_encoder
 from vulcanus.restful.resp import make_response, state
+from vulcanus.restful.serialize.query import parse_query_args
 from vulcanus.restful.serialize.validate import validate
-from vulcanus.rsa import load_public_key, verify_signature
-from vulcanus.token import decode_token, generate_token
+from vulcanus.rsa import verify_signature_with_pem
+from vulcanus.token import decode_token, generate_token, publish_token_invalidation, verified_token_cache
+
+
+# public key of the cluster each cluster user signs requests for, e.g {"admin": ("cluster_id", "public_key")}
+_CLUSTER_PUBLIC_KEYS = LocalCache(maxsize=1024, ttl=60)
+
+
+@retry(
+    stop_max_attempt_number=3,
+    wait_exponential_multiplier=1000,
+    wait_exponential_max=5000,
+    retry_on_exception=lambda exception: isinstance(exception, requests.exceptions.RequestException),
+)
+def _http_request(method, url, data, timeout, headers=None, files=None):
+    _request_param = dict(timeout=timeout, headers=headers)
+    if files:
+        _request_param.update(dict(data=data, files=files))
+    else:
+        _request_param.update(dict(json=data))
+    response = HttpClient.instance().request(method, url, **_request_param)
+    if response.status_code in RETRY_STATUS_CODES:
+        raise requests.exceptions.RequestException
+
+    return (
+        json.loads(response.text)
+        if response.status_code >= 200 and response.status_code < 300
+        else make_response(label=state.HTTP_CONNECT_ERROR, message=response.text)
+    )
 
 
 class BaseResponse(Resource):
@@ -40,10 +71,14 @@ class BaseResponse(Resource):
     Restful base class, offer a basic function that can handle the request.
     """
 
+    # serialize the response body, it can be replaced by a subclass of ResponseEncoder
+    encoder = response_encoder
+
     @classmethod
     def get_response(cls, method, url, data=None, header=None, timeout=TIMEOUT, files=None):
         """
-        send a request and get the response
+        send a request and get the response, the connection is taken from the pool of the process-wide
+        http client and kept alive for the following requests
 
         Args:
             method(str): request method
@@ -55,29 +90,6 @@ class BaseResponse(Resource):
         Returns:
             dict: response body
         """
-
-        @retry(
-            stop_max_attempt_number=3,
-            wait_exponential_multiplier=1000,
-            wait_exponential_max=5000,
-            retry_on_exception=lambda exception: isinstance(exception, requests.exceptions.RequestException),
-        )
-        def __http_request(method, url, data, timeout, headers=None, files=None):
-            _request_param = dict(method=method, url=url, timeout=timeout, headers=headers)
-            if files:
-                _request_param.update(dict(data=data, files=files))
-            else:
-                _request_param.update(dict(json=data))
-            response = requests.request(**_request_param)
-            if response.status_code in (500, 502, 503, 429, 408):
-                raise requests.exceptions.RequestException
-
-            return (
-                json.loads(response.text)
-                if response.status_code >= 200 and response.status_code < 300
-                else make_response(label=state.HTTP_CONNECT_ERROR, message=response.text)
-            )
-
         if data and not isinstance(data, dict):
             LOGGER.error("The param format of rest is not dict")
             return make_response(label=state.PARAM_ERROR)
@@ -87,7 +99,7 @@ class BaseResponse(Resource):
             if header:
                 request_body.update(dict(headers=header))
 
-            response = __http_request(**request_body)
+            response = _http_request(**request_body)
 
         except requests.exceptions.RequestException as error:
             LOGGER.error(error)
@@ -95,6 +107,32 @@ class BaseResponse(Resource):
 
         return response
 
+    @classmethod
+    async def get_responses_async(cls, requests_params, concurrency=50, timeout=TIMEOUT):
+        """
+        send a batch of requests concurrently and get all the responses
+
+        Args:
+            requests_params(list): parameters of every request, the keys are the same as the
+                arguments of get_response(method, url, data, header, timeout)
+            concurrency(int): maximum number of requests in flight at the same time
+            timeout(int): default timeout in seconds of every request
+
+        Returns:
+            list: response body of every request, in the same order as requests_params
+        """
+        return await AsyncHttpClient(concurrency=concurrency, timeout=timeout).request_all(requests_params)
+
+    @classmethod
+    def gather_responses(cls, requests_params, concurrency=50, timeout=TIMEOUT):
+        """
+        Synchronous entry of get_responses_async, it can't be called in a running event loop
+
+        Returns:
+            list: response body of every request, in the same order as requests_params
+        """
+        return asyncio.run(cls.get_responses_async(requests_params, concurrency=concurrency, timeout=timeout))
+
     @classmethod
     def verify_args(cls, args, schema, load=False):
         """
@@ -131,6 +169,10 @@ class BaseResponse(Resource):
         """
         if not token:
             return state.TOKEN_ERROR
+        verified_info = verified_token_cache.get(token)
+        if verified_info:
+            g.username = verified_info["sub"]
+            return state.SUCCEED
         try:
             verify_info = decode_token(token)
         except ExpiredSignatureError:
@@ -143,6 +185,7 @@ class BaseResponse(Resource):
             return state.TOKEN_EXPIRE
         if cache_token != token:
             return state.TOKEN_ERROR
+        verified_token_cache.set(token, verify_info, RedisProxy.redis_connect)
         g.username = verify_info["sub"]
         return state.SUCCEED
 
@@ -157,34 +200,46 @@ class BaseResponse(Resource):
 
     @staticmethod
     def _request_body():
-        def convert_data_type(input_value: str, need_unquote: bool = False):
-            """
-            Converts a string representation of a Python literal to its corresponding data type.
-            """
-            try:
-                data = json.loads(unquote(input_value)) if need_unquote else ast.literal_eval(input_value)
-            except (ValueError, SyntaxError):
-                data = input_value
-            return data
-
-        body = dict()
         if request.method != "GET" and not request.files:
             return request.get_json() or dict()
 
         elif request.files:
             return dict(request.form)
 
-        for key, value in request.args.items():
-            if (value.startswith("[") or value.startswith("{")) and (value.endswith("]") or value.endswith("}")):
-                body[key] = convert_data_type(value)
-            elif (value.startswith("%5B") and value.endswith("%5D")) or (
-                value.startswith("%7B") and value.endswith("%7D")
-            ):
-                body[key] = convert_data_type(value, True)
-            else:
-                body[key] = value
+        return parse_query_args(request.args)
+
+    @staticmethod
+    def _cluster_public_key(username):
+        """
+        Get the public key used to verify the signature of the requests from the user's cluster,
+        the lookup result is kept for a short time
+
+        Args:
+            username(str): username of the user in the cluster
 
-        return body
+        Returns:
+            tuple: cluster id of the current cluster, public key in pem format
+        """
+        cluster_public_key = _CLUSTER_PUBLIC_KEYS.get(username)
+        if cluster_public_key:
+            return cluster_public_key
+
+        from vulcanus.cache import RedisCacheManage
+
+        cache = RedisCacheManage(domain=configuration.domain, redis_client=RedisProxy.redis_connect, username=username)
+        if username == ADMIN_USER:
+            location_cluster = cache.location_cluster
+            public_key = location_cluster.get("public_key")
+        else:
+            items = cache.get_many("location_cluster", "get_user_cluster_private_key")
+            location_cluster = items["location_cluster"]
+            sub_cluster_user = items["get_user_cluster_private_key"].get(location_cluster.get("cluster_id"))
+            public_key = sub_cluster_user["public_key"] if sub_cluster_user else None
+        cluster_id = location_cluster.get("cluster_id")
+
+        if public_key:
+            _CLUSTER_PUBLIC_KEYS.set(username, (cluster_id, public_key))
+        return cluster_id, public_key
 
     @classmethod
     def verify_request(cls, schema=None, need_token=True, **kwargs):
@@ -212,8 +267,6 @@ class BaseResponse(Resource):
             ]
         ):
             g.username = request.headers.get("X-Cluster-Username")
-            from vulcanus.cache import RedisCacheManage
-
             if RedisProxy.redis_connect.exists("token-" + g.username + "-" + configuration.client_id):
                 g.headers["Access-Token"] = RedisProxy.redis_connect.get(
                     "token-" + g.username + "-" + configuration.client_id
@@ -224,16 +277,10 @@ class BaseResponse(Resource):
                     "token-" + g.username + "-" + configuration.client_id, g.headers["Access-Token"]
                 )
                 RedisProxy.redis_connect.expire("token-" + g.username + "-" + configuration.client_id, 60 * 20)
-            cache = RedisCacheManage(domain=configuration.domain, redis_client=RedisProxy.redis_connect)
+                publish_token_invalidation(RedisProxy.redis_connect, g.username, configuration.client_id)
             signature = request.headers.get("X-Signature")
-            if g.username == ADMIN_USER:
-                public_key = cache.location_cluster["public_key"]
-            else:
-                clusters = cache.get_user_cluster_private_key
-                sub_cluster_user = clusters.get(cache.location_cluster["cluster_id"])
-                public_key = sub_cluster_user["public_key"] if sub_cluster_user else None
-
-            if not public_key or not verify_signature(request_args, signature, load_public_key(public_key)):
+            cluster_id, public_key = cls._cluster_public_key(g.username)
+            if not public_key or not verify_signature_with_pem(request_args, signature, public_key, cluster_id):
                 return request_args, state.PERMISSION_ERROR
             need_token = False
         if schema:
@@ -284,7 +331,7 @@ class BaseResponse(Resource):
             file.save(os.path.join(save_path, username, file_name))
         return verify_res, username, file_name
 
-    def response(self, code, message=None, data=None):
+    def response(self, code, message=None, data=None, stream=False):
         """
         Gets the api response body information
 
@@ -292,6 +339,7 @@ class BaseResponse(Resource):
             code: status code of the response
             message: customize the prompt information
             data: response body content
+            stream: write the items of data (list or generator) into the response incrementally
 
         Returns:
             dict: response body e.g
@@ -302,7 +350,14 @@ class BaseResponse(Resource):
                     "label": ""
                 }
         """
-        return jsonify(make_response(label=code, message=message, data=data))
+        if stream:
+            return FlaskResponse(
+                stream_with_context(self.encoder.iter_encode(label=code, message=message, data=data)),
+                mimetype="application/json",
+            )
+        return FlaskResponse(
+            self.encoder.dumps(make_response(label=code, message=message, data=data)), mimetype="application/json"
+        )
 
     @staticmethod
     def handle(schema=None, token=True, debug=False, proxy=None):
@@ -343,11 +398,7 @@ class BaseResponse(Resource):
                 if not host_id:
                     return api_view(self, host_id=host_id, *args, **kwargs)
 
-                if not cache.get_user_group_hosts():
-                    return self.response(code=state.PERMISSION_ERROR)
-
-                host_ids = [host_in for host_ids in cache.all_groups_hosts.values() for host_in in host_ids]
-                if host_id not in host_ids:
+                if not cache.has_host_permission(host_id):
                     return self.response(code=state.PERMISSION_ERROR)
 
                 return api_view(self, host_id=host_id, *args, **kwargs)
@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description: parse the query string of GET requests
+"""
+import json
+import re
+from urllib.parse import unquote
+
+__all__ = ("parse_query_args", "parse_query_value")
+
+# a value longer than this or nested deeper than this is kept as a plain string
+MAX_VALUE_LENGTH = 65536
+MAX_NESTING_DEPTH = 16
+
+_OPEN_BRACKETS = frozenset("[{(")
+_CLOSE_BRACKETS = frozenset("]})")
+
+
+def _exceeds_depth(value, max_depth):
+    # the nesting can't be deeper than the number of open brackets
+    if value.count("[") + value.count("{") + value.count("(") <= max_depth:
+        return False
+    depth = 0
+    for char in value:
+        if char in _OPEN_BRACKETS:
+            depth += 1
+            if depth > max_depth:
+                return True
+        elif char in _CLOSE_BRACKETS:
+            depth -= 1
+    return False
+
+
+_WHITESPACE = re.compile(r"\s*")
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_KEYWORDS = (("True", True), ("False", False), ("None", None))
+_ESCAPES = {"\\": "\\", "'": "'", '"': '"', "n": "\n", "r": "\r", "t": "\t", "b": "\b", "f": "\f", "0": "\0"}
+_CLOSING = {"[": "]", "{": "}", "(": ")"}
+
+
+class _LiteralParser:
+    """
+    Parse python literals of lists, dicts, tuples, strings in single or double quotes, numbers,
+    True, False and None in one pass, without evaluating the value as python code
+    """
+
+    def __init__(self, text, max_depth):
+        self.text = text
+        self.max_depth = max_depth
+        self.pos = 0
+
+    def parse(self):
+        value = self._value(0)
+        self._skip()
+        if self.pos != len(self.text):
+            raise ValueError("Extra data at %d" % self.pos)
+        return value
+
+    def _skip(self):
+        self.pos = _WHITESPACE.match(self.text, self.pos).end()
+
+    def _value(self, depth):
+        self._skip()
+        char = self.text[self.pos : self.pos + 1]
+        if char in _CLOSING:
+            if depth >= self.max_depth:
+                raise ValueError("Nested too deep")
+            return self._container(char, depth + 1)
+        if char in ("'", '"'):
+            return self._string(char)
+        for keyword, value in _KEYWORDS:
+            if self.text.startswith(keyword, self.pos):
+                self.pos += len(keyword)
+                return value
+        match = _NUMBER.match(self.text, self.pos)
+        if not match:
+            raise ValueError("Unexpected value at %d" % self.pos)
+        self.pos = match.end()
+        number = match.group()
+        return int(number) if number.lstrip("-+").isdigit() else float(number)
+
+    def _container(self, opening, depth):
+        closing = _CLOSING[opening]
+        self.pos += 1
+        items, separated = [], True
+        while True:
+            self._skip()
+            if self.text.startswith(closing, self.pos):
+                self.pos += 1
+                break
+            if not separated:
+                raise ValueError("Expecting ',' at %d" % self.pos)
+            item = self._value(depth)
+            if opening == "{":
+                self._expect(":")
+                item = (item, self._value(depth))
+            items.append(item)
+            self._skip()
+            separated = self.text.startswith(",", self.pos)
+            if separated:
+                self.pos += 1
+        if opening == "[":
+            return items
+        if opening == "{":
+            # an unhashable key raises TypeError
+            return dict(items)
+        # "(1)" is just a parenthesized value, "(1,)" is a tuple
+        if len(items) == 1 and not separated:
+            return items[0]
+        return tuple(items)
+
+    def _expect(self, char):
+        self._skip()
+        if not self.text.startswith(char, self.pos):
+            raise ValueError("Expecting '%s' at %d" % (char, self.pos))
+        self.pos += 1
+
+    def _string(self, quote):
+        chars = []
+        pos = self.pos + 1
+        while True:
+            end = self.text.find(quote, pos)
+            if end < 0:
+                raise ValueError("Unterminated string at %d" % self.pos)
+            escape = self.text.find("\\", pos, end)
+            if escape < 0:
+                chars.append(self.text[pos:end])
+                self.pos = end + 1
+                return "".join(chars)
+            chars.append(self.text[pos:escape])
+            pos = self._escape(escape + 1, chars)
+
+    def _escape(self, pos, chars):
+        char = self.text[pos : pos + 1]
+        if char in _ESCAPES:
+            chars.append(_ESCAPES[char])
+            return pos + 1
+        width = {"x": 2, "u": 4}.get(char)
+        if width:
+            code = self.text[pos + 1 : pos + 1 + width]
+            if len(code) != width or not all(digit in "0123456789abcdefABCDEF" for digit in code):
+                raise ValueError("Invalid escape at %d" % pos)
+            chars.append(chr(int(code, 16)))
+            return pos + 1 + width
+        # an unknown escape is kept as it is, like python
+        chars.append("\\")
+        return pos
+
+
+def _is_container(value):
+    return value[0] in "[{" and value[-1] in "]}"
+
+
+def _is_quoted_container(value):
+    head, tail = value[:3].upper(), value[-3:].upper()
+    return head in ("%5B", "%7B") and tail in ("%5D", "%7D")
+
+
+def parse_query_value(value, max_length=MAX_VALUE_LENGTH, max_depth=MAX_NESTING_DEPTH):
+    """
+    Convert a list or dict in the query string to python object, e.g "[1,2]", "%5B1%2C2%5D" or "{'a': 1}",
+    other values are returned as they are
+
+    Args:
+        value(str): value of a query parameter
+        max_length(int): values longer than it are not converted
+        max_depth(int): values nested deeper than it are not converted
+
+    Returns:
+        converted value
+    """
+    if not value or len(value) > max_length:
+        return value
+
+    if _is_container(value):
+        text = value
+    elif _is_quoted_container(value):
+        text = unquote(value)
+    else:
+        return value
+
+    if _exceeds_depth(text, max_depth):
+        return value
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    # python literal, e.g "['a', 'b']" or "{'a': None}"
+    try:
+        return _LiteralParser(text, max_depth).parse()
+    except (ValueError, TypeError):
+        return value
+
+
+def parse_query_args(args, max_length=MAX_VALUE_LENGTH, max_depth=MAX_NESTING_DEPTH):
+    """
+    Convert the query parameters to request body, a repeated key is converted to list,
+    e.g "?host_id=1&host_id=2&page=1" is converted to {"host_id": ["1", "2"], "page": "1"}
+
+    Args:
+        args(MultiDict): query parameters of the request
+        max_length(int): values longer than it are not converted
+        max_depth(int): values nested deeper than it are not converted
+
+    Returns:
+        dict
+    """
+    body = dict()
+    for key, values in args.lists():
+        if len(values) > 1:
+            body[key] = [parse_query_value(value, max_length, max_depth) for value in values]
+        else:
+            body[key] = parse_query_value(values[0], max_length, max_depth)
+    return body
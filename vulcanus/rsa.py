@@ -10,11 +10,21 @@
 # PURPOSE.
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
+import hashlib
+import json
+
 from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
 
+from vulcanus.local_cache import LocalCache
+
+# deserialized public keys, keyed by (cluster id, sha256 of the pem)
+_PUBLIC_KEYS = LocalCache(maxsize=256, ttl=3600)
+# signatures verified successfully, keyed by (pem fingerprint, signature, sha256 of the signed data)
+_VERIFIED_SIGNATURES = LocalCache(maxsize=4096, ttl=300)
+
 
 def generate_rsa_key_pair():
     private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
@@ -32,8 +42,54 @@ def recursive_sort(data):
         return data
 
 
-def sign_data(data, private_key):
-    data = str(recursive_sort(data)).encode()
+# values whose repr is the same as in str(recursive_sort(data))
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _compatible_str(data):
+    if isinstance(data, dict):
+        return (
+            "{"
+            + ", ".join(
+                [
+                    repr(key)
+                    + ": "
+                    + (repr(data[key]) if type(data[key]) in _SCALAR_TYPES else _compatible_str(data[key]))
+                    for key in sorted(data)
+                ]
+            )
+            + "}"
+        )
+    if isinstance(data, list):
+        return (
+            "["
+            + ", ".join([repr(item) if type(item) in _SCALAR_TYPES else _compatible_str(item) for item in data])
+            + "]"
+        )
+    return repr(data)
+
+
+def canonical_bytes(data, compatible=True):
+    """
+    Serialize data with sorted keys into the bytes to be signed, the sorted copy of data is never built
+
+    Args:
+        data(dict/list): data to be signed
+        compatible(bool): produce the same bytes as str(recursive_sort(data)).encode(), which is the
+            format used by the earlier versions, otherwise produce compact json with sorted keys
+
+    Returns:
+        bytes
+    """
+    if not compatible:
+        return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+    if not isinstance(data, (dict, list)):
+        return str(data).encode()
+    return _compatible_str(data).encode()
+
+
+def sign_data(data, private_key, compatible=True):
+    data = canonical_bytes(data, compatible)
     signature = private_key.sign(
         data, padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH), hashes.SHA256()
     )
@@ -41,8 +97,12 @@ def sign_data(data, private_key):
     return signature.hex()
 
 
-def verify_signature(data, signature, public_key):
-    data = str(recursive_sort(data)).encode()
+def verify_signature(data, signature, public_key, compatible=True):
+    data = canonical_bytes(data, compatible)
+    return _verify(data, signature, public_key)
+
+
+def _verify(data, signature, public_key):
     signature = bytes.fromhex(signature)
     try:
         public_key.verify(
@@ -52,8 +112,61 @@ def verify_signature(data, signature, public_key):
             hashes.SHA256(),
         )
         return True
-    except InvalidSignature as e:
+    except InvalidSignature:
+        return False
+
+
+def _pem_fingerprint(public_pem_str):
+    return hashlib.sha256(public_pem_str.encode("utf-8")).hexdigest()
+
+
+def load_cached_public_key(public_pem_str, cluster_id=None):
+    """
+    Load the public key from pem, the deserialized key is cached by cluster id and pem fingerprint
+
+    Args:
+        public_pem_str(str): public key in pem format
+        cluster_id(str): cluster which the public key belongs to
+
+    Returns:
+        RSAPublicKey
+    """
+    return _load_public_key(public_pem_str, _pem_fingerprint(public_pem_str), cluster_id)
+
+
+def _load_public_key(public_pem_str, fingerprint, cluster_id):
+    public_key = _PUBLIC_KEYS.get((cluster_id, fingerprint))
+    if public_key is None:
+        public_key = load_public_key(public_pem_str)
+        _PUBLIC_KEYS.set((cluster_id, fingerprint), public_key)
+    return public_key
+
+
+def verify_signature_with_pem(data, signature, public_pem_str, cluster_id=None, compatible=True):
+    """
+    Verify the signature of data with a public key in pem format, both the deserialized public key
+    and the successful verification are cached
+
+    Args:
+        data(dict): signed data
+        signature(str): signature in hex
+        public_pem_str(str): public key in pem format
+        cluster_id(str): cluster which the public key belongs to
+        compatible(bool): whether data was serialized in the format of the earlier versions when signed
+
+    Returns:
+        bool: the signature is valid or not
+    """
+    fingerprint = _pem_fingerprint(public_pem_str)
+    data = canonical_bytes(data, compatible)
+    cache_key = (fingerprint, signature, hashlib.sha256(data).hexdigest())
+    if _VERIFIED_SIGNATURES.get(cache_key):
+        return True
+
+    if not _verify(data, signature, _load_public_key(public_pem_str, fingerprint, cluster_id)):
         return False
+    _VERIFIED_SIGNATURES.set(cache_key, True)
+    return True
 
 
 def get_public_key_pem_str(public_key):
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from vulcanus.local_cache import InvalidationListener, LocalCache
+from vulcanus.token import VerifiedTokenCache, decode_token, generate_token
+
+
+class TestLocalCache(unittest.TestCase):
+    def test_get_should_miss_when_entry_expired(self):
+        cache = LocalCache(maxsize=10, ttl=60)
+        cache.set("key", "value", ttl=0.01)
+        self.assertEqual(cache.get("key"), "value")
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats["hits"], 1)
+        self.assertEqual(cache.stats["misses"], 1)
+
+    def test_set_should_evict_least_recently_used_when_full(self):
+        cache = LocalCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats["evictions"], 1)
+
+    def test_remove_if_should_remove_matched_entries(self):
+        cache = LocalCache()
+        cache.set("a", {"user": "admin"})
+        cache.set("b", {"user": "test"})
+        self.assertEqual(cache.remove_if(lambda value: value["user"] == "admin"), 1)
+        self.assertEqual(len(cache), 1)
+
+
+@mock.patch.object(VerifiedTokenCache, "_ensure_listener", mock.Mock(return_value=True))
+class TestVerifiedTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.redis_client = mock.Mock()
+        self.token = generate_token(unique_iden="admin", aud="vulcanus")
+        self.cache = VerifiedTokenCache(maxsize=10, revalidate_window=30)
+
+    def test_get_should_return_claims_when_token_verified(self):
+        self.cache.set(self.token, decode_token(self.token), self.redis_client)
+        self.assertEqual(self.cache.get(self.token)["sub"], "admin")
+
+    def test_get_should_miss_when_token_key_changed_in_redis(self):
+        self.cache.set(self.token, decode_token(self.token), self.redis_client)
+        self.cache._on_message(
+            {"type": "pmessage", "channel": "__keyspace@0__:token-admin-vulcanus", "data": "del"}
+        )
+        self.assertIsNone(self.cache.get(self.token))
+
+    def test_get_should_miss_when_invalidation_published(self):
+        self.cache.set(self.token, decode_token(self.token), self.redis_client)
+        self.cache._on_message({"type": "message", "channel": "token-invalidate", "data": "token-admin-vulcanus"})
+        self.assertIsNone(self.cache.get(self.token))
+
+    def test_set_should_not_cache_when_window_disabled(self):
+        cache = VerifiedTokenCache(maxsize=10, revalidate_window=0)
+        cache.set(self.token, decode_token(self.token), self.redis_client)
+        self.assertIsNone(cache.get(self.token))
+
+
+class TestInvalidationListener(unittest.TestCase):
+    def setUp(self):
+        self.reset = threading.Event()
+        self.listener = InvalidationListener("channel", ("__keyspace@*__:key-*",), mock.Mock(), self.reset.set)
+        self.redis_client = mock.Mock()
+        self.pubsub = self.redis_client.pubsub.return_value
+
+    def test_listener_should_be_restarted_after_subscription_lost(self):
+        self.pubsub.listen.side_effect = RedisConnectionError("connection lost")
+        self.assertTrue(self.listener.ensure_started(self.redis_client))
+        self.assertTrue(self.reset.wait(1))
+        self.pubsub.close.assert_called_once()
+        # retried once per RECONNECT_INTERVAL, nothing should be cached in the meantime
+        self.assertFalse(self.listener.ensure_started(self.redis_client))
+        self.assertEqual(self.redis_client.pubsub.call_count, 1)
+
+        self.pubsub.listen.side_effect = lambda: iter(threading.Event().wait, True)
+        self.listener._retry_at = 0
+        self.assertTrue(self.listener.ensure_started(self.redis_client))
+        self.assertEqual(self.redis_client.pubsub.call_count, 2)
+
+    def test_token_should_not_be_cached_when_listener_not_running(self):
+        self.redis_client.pubsub.side_effect = RedisConnectionError("connection refused")
+        cache = VerifiedTokenCache(maxsize=10, revalidate_window=30)
+        token = generate_token(unique_iden="admin", aud="vulcanus")
+        cache.set(token, decode_token(token), self.redis_client)
+        self.assertIsNone(cache.get(token))
@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import json
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from flask import Flask, g
+
+from vulcanus.cache import RedisCacheManage, SingleFlight, shared_item_cache
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        shared_item_cache.clear()
+        patcher = mock.patch.object(shared_item_cache._listener, "ensure_started", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shared_item_cache.clear)
+        self.client = mock.MagicMock()
+        self.pipeline = self.client.pipeline.return_value
+        self.cache = RedisCacheManage(domain="127.0.0.1", redis_client=self.client, username="test")
+
+
+class TestRedisCacheRead(CacheTestCase):
+    def test_hash_should_query_once_and_treat_empty_as_miss(self):
+        self.client.hgetall.return_value = {}
+        self.assertIsNone(self.cache.hash("clusters"))
+        self.client.exists.assert_not_called()
+        self.client.hgetall.return_value = {"a": "1"}
+        self.assertEqual(self.cache.hash("clusters"), {"a": "1"})
+
+    def test_get_many_should_fetch_items_in_one_pipeline_and_memoize_in_request(self):
+        self.pipeline.execute.return_value = [
+            "normal",
+            {"c1": json.dumps({"cluster_id": "c1", "cluster_ip": "127.0.0.1"})},
+        ]
+        with Flask(__name__).app_context():
+            g.username = "test"
+            values = self.cache.get_many("user_role", "clusters")
+            self.assertEqual(values["user_role"], "normal")
+            self.assertEqual(values["clusters"]["c1"]["cluster_ip"], "127.0.0.1")
+            self.assertEqual(self.cache.clusters, values["clusters"])
+            self.assertEqual(self.cache.user_role, "normal")
+
+        self.pipeline.execute.assert_called_once()
+        self.client.hgetall.assert_not_called()
+        self.client.get.assert_not_called()
+
+
+class TestHostPermission(CacheTestCase):
+    def version(self, generation, user_groups):
+        return self.cache._user_hosts_version(generation, user_groups)
+
+    def test_has_host_permission_should_use_index_when_up_to_date(self):
+        user_groups = {"1": "g1"}
+        self.pipeline.execute.return_value = ["3", 1, user_groups, self.version("3", user_groups), True]
+        with mock.patch.object(RedisCacheManage, "get_user_group_hosts") as mock_groups:
+            self.assertTrue(self.cache.has_host_permission(3))
+        mock_groups.assert_not_called()
+        self.pipeline.sismember.assert_called_once_with("test_allowed_hosts", "3")
+        self.client.eval.assert_not_called()
+
+    def test_has_host_permission_should_rebuild_index_when_version_changed(self):
+        user_groups = {"1": "g1", "2": "g2"}
+        groups_hosts = {"1": [1, 2], "2": [3], "3": [4]}
+        for stale in (
+            ["4", 1, user_groups, self.version("3", user_groups), True],
+            ["3", 1, user_groups, self.version("3", {"1": "g1"}), True],
+            ["3", 0, user_groups, self.version("3", user_groups), True],
+            ["3", 1, user_groups, None, False],
+        ):
+            self.pipeline.execute.return_value = stale
+            with mock.patch.object(RedisCacheManage, "get_user_group_hosts", return_value=user_groups):
+                with mock.patch.object(
+                    RedisCacheManage, "all_groups_hosts", new_callable=mock.PropertyMock, return_value=groups_hosts
+                ):
+                    self.assertFalse(self.cache.has_host_permission(4))
+
+            key, *members = self.pipeline.sadd.call_args[0]
+            self.assertEqual(key, "test_allowed_hosts")
+            self.assertEqual(set(members), {"", "1", "2", "3"})
+            self.pipeline.set.assert_called_with(
+                "test_allowed_hosts:version", self.version(stale[0], user_groups), ex=mock.ANY
+            )
+
+    def test_refill_groups_hosts_should_increase_generation_of_index(self):
+        with mock.patch.object(RedisCacheManage, "_remote_api", return_value=(True, {"1": [1]})):
+            self.cache._refill_groups_hosts()
+        self.pipeline.incr.assert_called_once_with("groups_hosts:generation")
+
+
+class TestRefill(CacheTestCase):
+    def test_single_flight_should_call_once_for_concurrent_callers(self):
+        single_flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def refill():
+            calls.append(1)
+            started.set()
+            release.wait(1)
+            return {"a": 1}
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            leader = executor.submit(single_flight.do, "key", refill)
+            started.wait(1)
+            followers = [executor.submit(single_flight.do, "key", refill) for _ in range(4)]
+            self.assertIsNone(single_flight.do("key", refill, wait=False))
+            release.set()
+            results = [leader.result()] + [future.result() for future in followers]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"a": 1}] * 5)
+
+    def test_refill_should_wait_and_read_again_when_lease_held_by_other_process(self):
+        self.client.set.return_value = None
+        self.client.exists.side_effect = [1, 0]
+        self.client.hgetall.side_effect = [{}, {"c1": json.dumps({"cluster_id": "c1"})}]
+        with mock.patch.object(RedisCacheManage, "_remote_api") as mock_remote:
+            self.assertEqual(self.cache.clusters, {"c1": {"cluster_id": "c1"}})
+        mock_remote.assert_not_called()
+
+    def test_refill_should_call_remote_and_release_lease_when_acquired(self):
+        self.client.set.return_value = True
+        self.client.hgetall.side_effect = [{}, {"cluster_id": "c1"}]
+        with mock.patch.object(RedisCacheManage, "_remote_api", return_value=(True, None)) as mock_remote:
+            self.assertEqual(self.cache.location_cluster, {"cluster_id": "c1"})
+        mock_remote.assert_called_once()
+        lock_key = self.client.set.call_args[0][0]
+        self.assertEqual(self.client.eval.call_args[0][2], lock_key)
+
+    def test_all_groups_hosts_should_serve_stale_value_when_refilled_by_others(self):
+        self.pipeline.execute.return_value = [{"1": "[1, 2]"}, 0]
+        self.client.set.return_value = None
+        with mock.patch.object(RedisCacheManage, "_remote_api") as mock_remote:
+            self.assertEqual(self.cache.all_groups_hosts, {"1": [1, 2]})
+        mock_remote.assert_not_called()
+        self.client.exists.assert_not_called()
+
+    def test_get_many_should_refill_stale_groups_hosts_and_not_cache_it_in_process(self):
+        self.pipeline.execute.return_value = ["normal", {"1": "[1, 2]"}, 0]
+        self.client.set.return_value = None
+        with mock.patch.object(RedisCacheManage, "_remote_api") as mock_remote:
+            values = self.cache.get_many("user_role", "all_groups_hosts")
+        self.assertEqual(values["all_groups_hosts"], {"1": [1, 2]})
+        self.pipeline.exists.assert_called_once_with("groups_hosts" + RedisCacheManage.FRESH_SUFFIX)
+        self.client.set.assert_called_once()
+        mock_remote.assert_not_called()
+        self.assertNotIn("groups_hosts", shared_item_cache._cache._data)
+
+        self.pipeline.execute.return_value = [{"1": "[1, 2]"}, 1]
+        self.assertEqual(self.cache.get_many("all_groups_hosts"), {"all_groups_hosts": {"1": [1, 2]}})
+        self.assertIn("groups_hosts", shared_item_cache._cache._data)
+        self.client.set.assert_called_once()
+
+    def test_all_groups_hosts_should_write_jittered_ttl_when_refilled(self):
+        self.pipeline.execute.return_value = [{}, 0]
+        self.client.set.return_value = True
+        with mock.patch.object(RedisCacheManage, "_remote_api", return_value=(True, {"1": [1]})):
+            self.assertEqual(self.cache.all_groups_hosts, {"1": [1]})
+        _, ttl = self.pipeline.expire.call_args[0]
+        fresh_ttl = self.pipeline.set.call_args[1]["ex"]
+        self.assertTrue(60 <= fresh_ttl <= 72)
+        self.assertEqual(ttl, fresh_ttl + RedisCacheManage.GROUPS_HOSTS_STALE)
+
+
+class TestSharedItemCache(CacheTestCase):
+    def test_shared_item_should_be_read_from_redis_once_until_invalidated(self):
+        self.client.hgetall.return_value = {"cluster_id": "c1"}
+        other = RedisCacheManage(domain="127.0.0.1", redis_client=self.client, username="other")
+        self.assertEqual(self.cache.location_cluster, {"cluster_id": "c1"})
+        self.assertEqual(other.location_cluster, {"cluster_id": "c1"})
+        self.assertEqual(other.get_many("location_cluster"), {"location_cluster": {"cluster_id": "c1"}})
+        self.client.hgetall.assert_called_once()
+        self.pipeline.execute.assert_not_called()
+
+        shared_item_cache._listener.on_message(
+            {"type": "pmessage", "channel": "__keyspace@0__:location_cluster", "data": "hset"}
+        )
+        self.assertEqual(self.cache.location_cluster, {"cluster_id": "c1"})
+        self.assertEqual(self.client.hgetall.call_count, 2)
+        self.assertEqual(shared_item_cache.stats["hits"], 2)
+
+    def test_user_item_should_not_be_cached_in_process(self):
+        self.client.get.return_value = "normal"
+        self.assertEqual(self.cache.user_role, "normal")
+        self.assertEqual(self.cache.user_role, "normal")
+        self.assertEqual(self.client.get.call_count, 2)
+        self.assertEqual(len(shared_item_cache._cache), 0)
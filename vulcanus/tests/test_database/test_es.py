@@ -15,9 +15,12 @@ Time:
 Author:
 Description:
 """
+import json
+import threading
 import unittest
 from unittest import mock
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, NotFoundError
+from vulcanus.conf import JsonObject, configuration
 from vulcanus.database.proxy import ElasticsearchProxy
 from vulcanus.common import hash_value
 
@@ -59,3 +62,398 @@ class TestElasticsearchProxy(unittest.TestCase):
         paginate_param = dict()
         ElasticsearchProxy._make_es_paginate_body(paginate_param, body)
         self.assertEqual(body.get("from"), None)
+
+
+def _scroll_response(scroll_id, sources):
+    return {"_scroll_id": scroll_id, "hits": {"hits": [{"_source": source} for source in sources]}}
+
+
+class TestElasticsearchScanIter(unittest.TestCase):
+    def setUp(self):
+        self.es_proxy = ElasticsearchProxy(host="127.0.0.1", port=9200)
+        for method in ("search", "scroll", "clear_scroll"):
+            patcher = mock.patch.object(Elasticsearch, method)
+            setattr(self, "mock_" + method, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_scan_iter_should_yield_documents_page_by_page(self):
+        self.mock_search.return_value = _scroll_response("s1", [{"id": 1}, {"id": 2}])
+        self.mock_scroll.side_effect = [_scroll_response("s1", [{"id": 3}]), _scroll_response("s1", [])]
+        succeed, documents = self.es_proxy.scan_iter("task", {"query": {"match_all": {}}}, size=2, scroll="1m")
+        self.assertTrue(succeed)
+        self.mock_search.assert_called_once()
+        self.assertEqual(self.mock_search.call_args[1]["size"], 2)
+        self.assertEqual(list(documents), [{"id": 1}, {"id": 2}, {"id": 3}])
+        self.mock_clear_scroll.assert_called_once_with(body={"scroll_id": "s1"}, ignore=(404,))
+
+    def test_scan_iter_should_clear_scroll_when_stopped_early(self):
+        self.mock_search.return_value = _scroll_response("s1", [{"id": 1}, {"id": 2}])
+        _, batches = self.es_proxy.scan_iter("task", {}, batch=True)
+        self.assertEqual(next(batches), [{"id": 1}, {"id": 2}])
+        batches.close()
+        self.mock_scroll.assert_not_called()
+        self.mock_clear_scroll.assert_called_once()
+
+    def test_scan_iter_should_scroll_slices_in_parallel(self):
+        def search(index, body, **kwargs):
+            slice_id = body["slice"]["id"]
+            return _scroll_response("s%s" % slice_id, [{"slice": slice_id}])
+
+        self.mock_search.side_effect = search
+        self.mock_scroll.side_effect = lambda body: _scroll_response(body["scroll_id"], [])
+        _, documents = self.es_proxy.scan_iter("task", {"query": {"match_all": {}}}, slices=3)
+        self.assertEqual(sorted(document["slice"] for document in documents), [0, 1, 2])
+        self.assertEqual(self.mock_clear_scroll.call_count, 3)
+
+    def test_scan_iter_should_clear_scroll_when_dropped_before_iterated(self):
+        self.mock_search.return_value = _scroll_response("s1", [{"id": 1}])
+        succeed, documents = self.es_proxy.scan_iter("task", {})
+        self.assertTrue(succeed)
+        del documents
+        self.mock_clear_scroll.assert_called_once_with(body={"scroll_id": "s1"}, ignore=(404,))
+
+    def test_scan_iter_should_raise_error_of_slice_instead_of_waiting(self):
+        def search(index, body, **kwargs):
+            return _scroll_response("s%s" % body["slice"]["id"], [{"slice": body["slice"]["id"]}])
+
+        self.mock_search.side_effect = search
+        self.mock_scroll.side_effect = lambda body: {"_scroll_id": body["scroll_id"]}
+        _, documents = self.es_proxy.scan_iter("task", {}, slices=2)
+        result = []
+        worker = threading.Thread(target=lambda: result.append(self._consume(documents)), daemon=True)
+        worker.start()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertIsInstance(result[0], KeyError)
+        # the scroll of the failed slice is cleared before its error is passed to the consumer
+        self.mock_clear_scroll.assert_called()
+
+    @staticmethod
+    def _consume(documents):
+        try:
+            list(documents)
+        except KeyError as error:
+            return error
+        return None
+
+    def test_scan_iter_should_return_empty_when_index_not_found(self):
+        self.mock_search.side_effect = NotFoundError(404, "index_not_found_exception")
+        succeed, documents = self.es_proxy.scan_iter("task", {})
+        self.assertTrue(succeed)
+        self.assertEqual(list(documents), [])
+
+
+class TestElasticsearchSearchAfter(unittest.TestCase):
+    def setUp(self):
+        self.es_proxy = ElasticsearchProxy(host="127.0.0.1", port=9200)
+        self.body = {"query": {"match_all": {}}, "sort": [{"timestamp": "desc"}, {"task_id": "asc"}]}
+
+    @staticmethod
+    def _response(sorts, pit_id=None):
+        response = {"hits": {"hits": [{"_source": {"task_id": sort[1]}, "sort": sort} for sort in sorts]}}
+        if pit_id:
+            response["pit_id"] = pit_id
+        return response
+
+    @mock.patch.object(Elasticsearch, "search")
+    def test_search_after_should_continue_from_cursor(self, mock_search):
+        mock_search.side_effect = [self._response([[3, "a"], [2, "b"]]), self._response([[1, "c"]])]
+        succeed, result = self.es_proxy.search_after("task", self.body, 2)
+        self.assertTrue(succeed)
+        self.assertNotIn("from", mock_search.call_args[1]["body"])
+
+        succeed, result = self.es_proxy.search_after("task", self.body, 2, cursor=result["cursor"])
+        self.assertEqual(mock_search.call_args[1]["body"]["search_after"], [2, "b"])
+        self.assertEqual(mock_search.call_args[1]["index"], "task")
+        self.assertIsNone(result["cursor"])
+        self.assertNotIn("search_after", self.body)
+
+    @mock.patch.object(Elasticsearch, "close_point_in_time")
+    @mock.patch.object(Elasticsearch, "open_point_in_time", return_value={"id": "pit1"})
+    @mock.patch.object(Elasticsearch, "search")
+    def test_search_after_should_query_in_point_in_time(self, mock_search, mock_open, mock_close):
+        mock_search.side_effect = [self._response([[3, "a"]], "pit2"), self._response([], "pit3")]
+        _, result = self.es_proxy.search_after("task", self.body, 1, point_in_time=True, keep_alive="2m")
+        mock_open.assert_called_once_with(index="task", keep_alive="2m")
+        self.assertEqual(mock_search.call_args[1]["body"]["pit"], {"id": "pit1", "keep_alive": "2m"})
+        mock_close.assert_not_called()
+
+        _, result = self.es_proxy.search_after("task", self.body, 1, cursor=result["cursor"])
+        self.assertEqual(mock_search.call_args[1]["body"]["pit"]["id"], "pit2")
+        self.assertNotIn("index", mock_search.call_args[1])
+        self.assertIsNone(result["cursor"])
+        mock_close.assert_called_once_with(body={"id": "pit3"}, ignore=(404,))
+
+    def test_search_after_should_fail_when_cursor_invalid(self):
+        self.assertEqual(self.es_proxy.search_after("task", self.body, 2, cursor="invalid"), (False, {}))
+
+    @mock.patch.object(Elasticsearch, "search")
+    def test_search_after_should_fail_when_point_in_time_expired(self, mock_search):
+        mock_search.side_effect = [self._response([[3, "a"]], "pit1"), NotFoundError(404, "search_context_missing")]
+        with mock.patch.object(Elasticsearch, "open_point_in_time", return_value={"id": "pit1"}):
+            _, result = self.es_proxy.search_after("task", self.body, 1, point_in_time=True)
+        self.assertEqual(self.es_proxy.search_after("task", self.body, 1, cursor=result["cursor"]), (False, {}))
+
+    @mock.patch.object(Elasticsearch, "search")
+    def test_search_after_should_return_empty_page_when_index_not_found(self, mock_search):
+        mock_search.side_effect = NotFoundError(404, "index_not_found_exception")
+        succeed, result = self.es_proxy.search_after("task", self.body, 2)
+        self.assertTrue(succeed)
+        self.assertEqual(result, {"hits": {"hits": []}, "cursor": None})
+
+    def test_search_after_should_fail_when_body_not_sorted(self):
+        with mock.patch.object(Elasticsearch, "search") as mock_search:
+            self.assertEqual(self.es_proxy.search_after("task", {"query": {"match_all": {}}}, 2), (False, {}))
+        mock_search.assert_not_called()
+
+
+class FakeBulk:
+    """
+    Respond to the bulk requests, the documents whose name is in statuses fail with the status
+    """
+
+    def __init__(self, statuses=None):
+        self.statuses = statuses or dict()
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def __call__(self, body, **kwargs):
+        lines = [json.loads(line) for line in body.splitlines() if line]
+        items = []
+        for action_line, source in zip(lines[::2], lines[1::2]):
+            op_type = next(iter(action_line))
+            name = source.get("name") or source.get("doc", {}).get("name")
+            status = self.statuses.pop(name, 201)
+            item = {
+                "_index": action_line[op_type].get("_index"),
+                "_id": action_line[op_type].get("_id", "id-%s" % name),
+                "status": status,
+            }
+            if status >= 300:
+                item["error"] = {"type": "es_rejected_execution_exception" if status == 429 else "mapper_exception"}
+            items.append({op_type: item})
+        with self._lock:
+            self.requests.append(len(items))
+        return {"errors": any("error" in next(iter(item.values())) for item in items), "items": items}
+
+
+class TestElasticsearchBulk(unittest.TestCase):
+    def setUp(self):
+        self.es_proxy = ElasticsearchProxy(host="127.0.0.1", port=9200)
+        patcher = mock.patch("vulcanus.database.proxy.time.sleep")
+        self.mock_sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_insert_bulk_should_send_generator_in_chunks(self):
+        fake_bulk = FakeBulk()
+        with mock.patch.object(Elasticsearch, "bulk", side_effect=fake_bulk):
+            documents = ({"name": "doc%s" % index} for index in range(5))
+            self.assertTrue(self.es_proxy.insert_bulk("task", documents, chunk_size=2))
+        self.assertEqual(fake_bulk.requests, [2, 2, 1])
+
+    def test_insert_bulk_should_report_inserted_and_failed_documents_when_asked(self):
+        fake_bulk = FakeBulk({"doc1": 400})
+        with mock.patch.object(Elasticsearch, "bulk", side_effect=fake_bulk):
+            documents = ({"name": "doc%s" % index} for index in range(3))
+            succeed, fail_list, succeed_ids = self.es_proxy.insert_bulk("task", documents, details=True)
+        self.assertFalse(succeed)
+        self.assertEqual([fail["action"]["_source"]["name"] for fail in fail_list], ["doc1"])
+        self.assertEqual(succeed_ids, ["id-doc0", "id-doc2"])
+
+    def test_update_bulk_should_report_updated_ids_when_asked(self):
+        fake_bulk = FakeBulk()
+        data = [{"_id": "id%s" % index, "doc": {"name": "doc%s" % index}} for index in range(2)]
+        with mock.patch.object(Elasticsearch, "bulk", side_effect=fake_bulk):
+            self.assertEqual(self.es_proxy.update_bulk("task", data, details=True), (True, [], ["id0", "id1"]))
+            self.assertTrue(self.es_proxy.update_bulk("task", data))
+
+    def test_bulk_should_retry_rejected_documents_with_backoff(self):
+        fake_bulk = FakeBulk({"doc1": 429, "doc3": 400})
+        results = []
+        actions = [{"_index": "task", "_source": {"name": "doc%s" % index}} for index in range(4)]
+        with mock.patch.object(Elasticsearch, "bulk", side_effect=fake_bulk):
+            succeed, fail_list = self.es_proxy.bulk(
+                iter(actions), initial_backoff=1, callback=lambda *result: results.append(result)
+            )
+        self.assertFalse(succeed)
+        self.assertEqual(fail_list[0]["action"], actions[3])
+        self.assertEqual(fail_list[0]["status"], 400)
+        self.assertEqual(fake_bulk.requests, [4, 1])
+        self.mock_sleep.assert_called_once_with(1)
+        names = sorted(action["_source"]["name"] for _, action, _ in results)
+        self.assertEqual(names, ["doc0", "doc1", "doc2", "doc3"])
+
+    def test_bulk_should_pair_results_with_actions_in_parallel(self):
+        fake_bulk = FakeBulk({"doc7": 400})
+        results = {}
+        actions = ({"_index": "task", "_source": {"name": "doc%s" % index}} for index in range(20))
+        with mock.patch.object(Elasticsearch, "bulk", side_effect=fake_bulk):
+            succeed, fail_list = self.es_proxy.bulk(
+                actions,
+                chunk_size=3,
+                thread_count=3,
+                callback=lambda ok, action, result: results.update({action["_source"]["name"]: ok}),
+            )
+        self.assertFalse(succeed)
+        self.assertEqual(len(results), 20)
+        self.assertEqual([name for name, ok in results.items() if not ok], ["doc7"])
+        self.assertEqual(fail_list[0]["action"]["_source"]["name"], "doc7")
+
+
+class TestElasticsearchMsearchAndCache(unittest.TestCase):
+    def setUp(self):
+        self.es_proxy = ElasticsearchProxy(host="127.0.0.1", port=9200)
+        ElasticsearchProxy._result_cache.clear()
+        self.addCleanup(ElasticsearchProxy._result_cache.clear)
+        self.body = {"query": {"term": {"task_id": "90d0a61e32a811ee8677000c29766160"}}}
+
+    @mock.patch.object(Elasticsearch, "index")
+    @mock.patch.object(Elasticsearch, "search")
+    def test_query_should_cache_result_until_index_written(self, mock_search, mock_index):
+        mock_search.side_effect = [{"hits": {"hits": [1]}}, {"hits": {"hits": [1, 2]}}]
+        self.assertEqual(self.es_proxy.query("task", self.body, cache_ttl=10)[1], {"hits": {"hits": [1]}})
+        self.assertEqual(self.es_proxy.query("task", dict(self.body), cache_ttl=10)[1], {"hits": {"hits": [1]}})
+        self.assertEqual(mock_search.call_count, 1)
+
+        self.es_proxy.insert("task", {"task_id": "xxx"})
+        self.assertEqual(self.es_proxy.query("task", self.body, cache_ttl=10)[1], {"hits": {"hits": [1, 2]}})
+        self.assertEqual(mock_search.call_count, 2)
+
+    @mock.patch.object(Elasticsearch, "count")
+    @mock.patch.object(Elasticsearch, "search")
+    def test_query_of_several_indices_should_be_invalidated_by_any_of_them(self, mock_search, mock_count):
+        mock_search.return_value = {"hits": {"hits": []}}
+        mock_count.return_value = {"count": 1}
+        for _ in range(2):
+            self.es_proxy.query(["task", "host"], self.body, cache_ttl=10)
+            self.es_proxy.query("host,task", self.body, cache_ttl=10)
+            self.es_proxy.count(["task", "host"], self.body, cache_ttl=10)
+        self.assertEqual(mock_search.call_count, 1)
+        self.assertEqual(mock_count.call_count, 1)
+
+        ElasticsearchProxy.invalidate_cache("host")
+        self.es_proxy.query(["task", "host"], self.body, cache_ttl=10)
+        self.assertEqual(mock_search.call_count, 2)
+
+    @mock.patch.object(Elasticsearch, "msearch")
+    @mock.patch.object(Elasticsearch, "search")
+    def test_query_of_wildcard_should_not_be_cached(self, mock_search, mock_msearch):
+        mock_search.return_value = {"hits": {"hits": []}}
+        mock_msearch.return_value = {"responses": [{"hits": {"hits": []}}]}
+        for _ in range(2):
+            self.es_proxy.query("task-*", self.body, cache_ttl=10)
+            self.es_proxy.msearch([("_all", self.body)], cache_ttl=10)
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertEqual(mock_msearch.call_count, 2)
+        self.assertEqual(len(ElasticsearchProxy._result_cache), 0)
+
+    @mock.patch.object(Elasticsearch, "search")
+    def test_query_should_not_cache_by_default(self, mock_search):
+        mock_search.return_value = {"hits": {"hits": []}}
+        self.es_proxy.query("task", self.body)
+        self.es_proxy.query("task", self.body)
+        self.assertEqual(mock_search.call_count, 2)
+
+    @mock.patch.object(Elasticsearch, "msearch")
+    def test_msearch_should_query_in_one_request_and_skip_cached(self, mock_msearch):
+        mock_msearch.return_value = {
+            "responses": [
+                {"hits": {"hits": ["task"]}},
+                {"error": {"type": "index_not_found_exception"}, "status": 404},
+                {"error": {"type": "search_phase_execution_exception"}, "status": 400},
+            ]
+        }
+        searches = [("task", self.body), ("missing", self.body), ("host", {"query": {"bad": {}}})]
+        succeed, results = self.es_proxy.msearch(searches, source=["task_id"], cache_ttl=10)
+        self.assertTrue(succeed)
+        self.assertEqual(results, [{"hits": {"hits": ["task"]}}, [], None])
+        request = mock_msearch.call_args[1]["body"]
+        self.assertEqual(request[0], {"index": "task"})
+        self.assertEqual(request[1]["_source"], ["task_id"])
+
+        mock_msearch.return_value = {"responses": [{"hits": {"hits": []}}, {"hits": {"hits": []}}]}
+        succeed, results = self.es_proxy.msearch(searches, source=["task_id"], cache_ttl=10)
+        self.assertEqual(results[0], {"hits": {"hits": ["task"]}})
+        headers = mock_msearch.call_args[1]["body"][::2]
+        self.assertEqual(headers, [{"index": "missing"}, {"index": "host"}])
+
+    @mock.patch.object(Elasticsearch, "delete_by_query")
+    @mock.patch.object(Elasticsearch, "count")
+    def test_count_should_cache_result_until_index_written(self, mock_count, mock_delete):
+        mock_count.side_effect = [{"count": 0}, {"count": 3}]
+        self.assertEqual(self.es_proxy.count("task", self.body, cache_ttl=10), (True, 0))
+        self.assertEqual(self.es_proxy.count("task", self.body, cache_ttl=10), (True, 0))
+        self.assertEqual(mock_count.call_count, 1)
+
+        self.es_proxy.delete("task", self.body)
+        self.assertEqual(self.es_proxy.count("task", self.body, cache_ttl=10), (True, 3))
+
+    @mock.patch.object(Elasticsearch, "msearch")
+    def test_msearch_should_count_in_one_request(self, mock_msearch):
+        mock_msearch.return_value = {
+            "responses": [
+                {"hits": {"total": {"value": 12, "relation": "eq"}, "hits": []}},
+                {"error": {"type": "index_not_found_exception"}, "status": 404},
+            ]
+        }
+        searches = [("task", self.body), ("missing", self.body)]
+        self.assertEqual(self.es_proxy.msearch(searches, count=True, cache_ttl=10), (True, [12, 0]))
+        request = mock_msearch.call_args[1]["body"]
+        self.assertEqual(request[1], dict(self.body, size=0, track_total_hits=True))
+        self.assertNotIn("size", self.body)
+
+        with mock.patch.object(Elasticsearch, "count") as mock_count:
+            self.assertEqual(self.es_proxy.count("task", self.body, cache_ttl=10), (True, 12))
+        mock_count.assert_not_called()
+
+
+class TestElasticsearchClient(unittest.TestCase):
+    @mock.patch.object(ElasticsearchProxy, "_es_db", None)
+    def test_client_should_be_created_from_config(self):
+        es_config = JsonObject(
+            dict(
+                host="127.0.0.1",
+                port=9200,
+                hosts=["192.168.1.2:9201", "192.168.1.3", {"host": "192.168.1.4"}],
+                maxsize=30,
+                http_compress=True,
+                max_retries=5,
+                retry_on_timeout=True,
+                retry_on_status=[503],
+            )
+        )
+        with mock.patch.object(configuration, "elasticsearch", es_config):
+            ElasticsearchProxy()
+            transport = ElasticsearchProxy._es_db.transport
+        self.assertEqual(
+            transport.hosts,
+            [
+                {"host": "192.168.1.2", "port": 9201},
+                {"host": "192.168.1.3", "port": 9200},
+                {"host": "192.168.1.4", "port": 9200},
+            ],
+        )
+        self.assertEqual((transport.max_retries, transport.retry_on_timeout), (5, True))
+        self.assertEqual(transport.retry_on_status, (503,))
+        self.assertTrue(transport.connection_pool.connections[0].http_compress)
+
+    @mock.patch.object(Elasticsearch, "count", return_value={"count": 3})
+    @mock.patch.object(Elasticsearch, "search", return_value={"hits": {"hits": []}})
+    def test_request_timeout_should_be_passed_to_all_requests(self, mock_search, mock_count):
+        es_proxy = ElasticsearchProxy(host="127.0.0.1", port=9200, request_timeout=5)
+        es_proxy.query("task", {})
+        self.assertEqual(es_proxy.count("task", {}), (True, 3))
+        self.assertEqual(mock_search.call_args[1]["request_timeout"], 5)
+        self.assertEqual(mock_count.call_args[1]["request_timeout"], 5)
+        ElasticsearchProxy(host="127.0.0.1", port=9200).query("task", {})
+        self.assertNotIn("request_timeout", mock_search.call_args[1])
+
+    def test_health_should_report_status_and_latency(self):
+        es_proxy = ElasticsearchProxy(host="127.0.0.1", port=9200, request_timeout=1)
+        with mock.patch("elasticsearch.client.ClusterClient.health") as mock_health:
+            mock_health.return_value = {"status": "yellow", "number_of_nodes": 2}
+            available, status = es_proxy.health()
+        self.assertTrue(available)
+        self.assertEqual((status["status"], status["number_of_nodes"]), ("yellow", 2))
+        self.assertGreaterEqual(status["latency"], 0)
+        self.assertEqual(mock_health.call_args[1]["request_timeout"], 1)
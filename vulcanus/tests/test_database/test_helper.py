@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from vulcanus.database.helper import (
+    create_database_engine,
+    make_mysql_engine_options,
+    next_page_cursor,
+    sort_and_page,
+)
+from vulcanus.database.pool import TimedQueuePool, pool_status
+from vulcanus.tests.test_database.for_mysql.models import Base, Test
+
+
+class TestSortAndPage(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        # ages have duplicates, so the primary key breaks the ties
+        self.session.add_all([Test(id=index, name="name%s" % index, age=index // 3) for index in range(1, 11)])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_offset_page_should_be_same_as_before(self):
+        query, total_page = sort_and_page(self.session.query(Test), Test.id, "desc", 4, 2)
+        self.assertEqual(total_page, 3)
+        self.assertEqual([row.id for row in query], [6, 5, 4, 3])
+
+    def test_keyset_page_should_walk_through_all_records(self):
+        for direction in ("asc", "desc"):
+            cursor, ids = None, []
+            while True:
+                query, total_page = sort_and_page(
+                    self.session.query(Test), Test.age, direction, 4, None, cursor=cursor, primary_key=Test.id
+                )
+                records = query.all()
+                ids.extend(record.id for record in records)
+                cursor = next_page_cursor(records, Test.age, Test.id, 4)
+                if cursor is None:
+                    break
+            self.assertEqual(total_page, 3)
+            expected = sorted(range(1, 11), key=lambda index: (index // 3, index), reverse=direction == "desc")
+            self.assertEqual(ids, expected)
+
+    def test_keyset_page_should_skip_count_when_not_required(self):
+        query, total_page = sort_and_page(
+            self.session.query(Test), None, "asc", 3, None, cursor=None, primary_key=Test.id, count=False
+        )
+        self.assertIsNone(total_page)
+        records = query.all()
+        self.assertEqual([record.id for record in records], [1, 2, 3])
+        query, _ = sort_and_page(
+            self.session.query(Test),
+            None,
+            "asc",
+            3,
+            None,
+            cursor=next_page_cursor(records, None, Test.id, 3),
+            primary_key=Test.id,
+            count=False,
+        )
+        self.assertEqual([record.id for record in query], [4, 5, 6])
+
+    def test_keyset_page_should_reject_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            sort_and_page(self.session.query(Test), Test.age, "asc", 3, None, cursor="abc!", primary_key=Test.id)
+
+
+class TestCreateDatabaseEngine(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.url = "sqlite:///" + os.path.join(directory.name, "test.db")
+
+    def test_make_mysql_engine_options_should_skip_unset_options(self):
+        mysql = SimpleNamespace(max_overflow=5, pool_timeout=None, pool_use_lifo=True)
+        options = make_mysql_engine_options(SimpleNamespace(mysql=mysql))
+        self.assertEqual(options, {"max_overflow": 5, "pool_use_lifo": True})
+
+    def test_pool_status_should_record_checkouts_waits_and_invalidations(self):
+        engine = create_database_engine(self.url, 1, 7200, max_overflow=1, pool_timeout=1, pool_use_lifo=True)
+        self.addCleanup(engine.dispose)
+        self.assertIsInstance(engine.pool, TimedQueuePool)
+
+        with engine.connect() as first, engine.connect() as second:
+            first.execute(text("select 1"))
+            status = pool_status(engine)
+            self.assertEqual((status["checked_out"], status["overflow"]), (2, 1))
+            second.invalidate()
+        status = pool_status(engine)
+        self.assertEqual(status["checkouts"], 2)
+        self.assertEqual(status["checked_out"], 0)
+        self.assertEqual(status["invalidations"], 1)
+        self.assertEqual(status["wait_count"], 2)
+        self.assertEqual(status["wait_histogram"]["+Inf"], 2)
+
+        engine.dispose()
+        with engine.connect():
+            pass
+        self.assertEqual(pool_status(engine)["wait_count"], 3)
@@ -15,12 +15,26 @@ Time:
 Author:
 Description:
 """
+import os
+import tempfile
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.scoping import scoped_session
 
-from vulcanus.database.proxy import MysqlProxy
+from flask import Flask
+
+from vulcanus.database.pool import get_pool_metrics
+from vulcanus.database.proxy import MysqlProxy, remove_session, session_registry
 from vulcanus.database.helper import create_database_engine
+from vulcanus.database import router as replica_router
+from vulcanus.database.router import ReplicaRouter, mysql_replica_lag
 from vulcanus.tests.test_database.for_mysql.models import Base, Test
 
 
@@ -62,3 +76,279 @@ class TestMysqlProxy(unittest.TestCase):
         self.assertTrue(res)
         res = self.mysql_proxy.select([Test], condition={})
         self.assertEqual(len(res[1]), 1)
+
+
+class TestMysqlProxyWithSqlite(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        patcher = mock.patch.object(MysqlProxy, "engine", self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_insert_many_should_commit_once_per_chunk(self):
+        rows = [{"name": "name%s" % index, "age": index} for index in range(25)]
+        with MysqlProxy() as proxy:
+            with mock.patch.object(proxy.session, "commit", wraps=proxy.session.commit) as mock_commit:
+                self.assertEqual(proxy.insert_many(Test, rows, chunk_size=10), (True, []))
+            self.assertEqual(mock_commit.call_count, 3)
+            self.assertEqual(len(proxy.select([Test], {})[1]), 25)
+
+    def test_insert_many_should_report_failed_chunk(self):
+        rows = [{"name": "name%s" % index, "age": index} for index in range(4)]
+        rows[2]["age"] = None
+        with MysqlProxy() as proxy:
+            succeed, fail_chunks = proxy.insert_many(Test, rows, chunk_size=2)
+            self.assertFalse(succeed)
+            self.assertEqual(fail_chunks, [rows[2:]])
+            self.assertEqual(len(proxy.select([Test], {})[1]), 2)
+
+    def test_delete_in_should_delete_in_chunks(self):
+        with MysqlProxy() as proxy:
+            proxy.insert_many(Test, [{"id": index, "name": "name", "age": index} for index in range(1, 11)])
+            self.assertEqual(proxy.delete_in(Test, "id", range(1, 8), chunk_size=3), (True, []))
+            res = proxy.select([Test.id], {})
+            self.assertEqual(sorted(row[0] for row in res[1]), [8, 9, 10])
+
+    def test_upsert_statement_should_update_non_primary_key_columns(self):
+        with MysqlProxy() as proxy:
+            with mock.patch.object(proxy.session, "execute") as mock_execute:
+                succeed, _ = proxy.upsert_many(Test, [{"id": 1, "name": "Ada", "age": 11}])
+        self.assertTrue(succeed)
+        statement, rows = mock_execute.call_args[0]
+        self.assertEqual(rows, [{"id": 1, "name": "Ada", "age": 11}])
+        sql = str(statement.compile(dialect=mysql.dialect()))
+        self.assertIn("ON DUPLICATE KEY UPDATE name = VALUES(name), age = VALUES(age)", sql)
+
+    def test_upsert_statement_should_keep_existing_rows_when_no_column_to_update(self):
+        with MysqlProxy() as proxy:
+            with mock.patch.object(proxy.session, "execute") as mock_execute:
+                self.assertEqual(proxy.upsert_many(Test, [{"id": 1}, {"id": 2}]), (True, []))
+                self.assertEqual(proxy.upsert_many(Test, [{"id": 1, "name": "Ada"}], update_columns=[]), (True, []))
+        for call in mock_execute.call_args_list:
+            sql = str(call[0][0].compile(dialect=mysql.dialect()))
+            self.assertNotIn("IGNORE", sql)
+            self.assertTrue(sql.endswith("ON DUPLICATE KEY UPDATE id = test.id"), sql)
+
+    def test_upsert_many_should_report_chunk_violating_constraint(self):
+        rows = [{"id": 1}, {"id": 2}, {"id": None}]
+        error = sqlalchemy.exc.IntegrityError("INSERT", {}, Exception("Column 'id' cannot be null"))
+        with MysqlProxy() as proxy:
+            with mock.patch.object(proxy.session, "execute", side_effect=[None, error]):
+                succeed, fail_chunks = proxy.upsert_many(Test, rows, chunk_size=2)
+        self.assertFalse(succeed)
+        self.assertEqual(fail_chunks, [[{"id": None}]])
+
+    def test_select_iter_should_return_tuples_for_field_list(self):
+        with MysqlProxy() as proxy:
+            proxy.insert_many(Test, [{"name": "name%s" % index, "age": index} for index in range(5)])
+            succeed, rows = proxy.select_iter([Test.name, Test.age], {}, chunk_size=2)
+            self.assertTrue(succeed)
+            self.assertEqual(sorted(rows), [("name%s" % index, index) for index in range(5)])
+            succeed, rows = proxy.select_iter([Test], {"age": 3})
+            self.assertEqual([row.name for row in rows], ["name3"])
+
+    def test_select_iter_should_pass_chunks_to_callback(self):
+        chunks = []
+        with MysqlProxy() as proxy:
+            proxy.insert_many(Test, [{"name": "name", "age": index} for index in range(5)])
+            self.assertEqual(proxy.select_iter([Test.age], {}, chunk_size=2, callback=chunks.append), (True, 5))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[0][0], (0,))
+
+    def test_select_iter_should_stream_in_session_of_its_own(self):
+        with MysqlProxy() as proxy:
+            proxy.insert_many(Test, [{"name": "name", "age": index} for index in range(5)])
+            _, rows = proxy.select_iter([Test.age], {}, chunk_size=2)
+            self.assertEqual(next(rows), (0,))
+            self.assertIsNot(rows._session, proxy.session)
+            # the proxy can query while the rows are streamed
+            self.assertEqual(len(proxy.select([Test], {})[1]), 5)
+            stream_session = rows._session
+            with mock.patch.object(stream_session, "close", wraps=stream_session.close) as mock_close:
+                self.assertEqual(list(rows), [(index,) for index in range(1, 5)])
+            mock_close.assert_called_once()
+            self.assertTrue(rows.succeed)
+
+    def test_select_iter_should_report_error_raised_midway(self):
+        def yield_per(query, chunk_size):
+            yield (1,)
+            raise sqlalchemy.exc.OperationalError("SELECT", {}, Exception("Lost connection"))
+
+        with MysqlProxy() as proxy, mock.patch.object(sqlalchemy.orm.Query, "yield_per", yield_per):
+            succeed, rows = proxy.select_iter([Test.age], {})
+            self.assertTrue(succeed)
+            self.assertEqual(list(rows), [(1,)])
+            self.assertFalse(rows.succeed)
+            self.assertEqual(proxy.select_iter([Test.age], {}, callback=lambda chunk: None), (False, 1))
+
+
+class TestMysqlSessionRegistry(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_database_engine("sqlite://", 5, 7200)
+        Base.metadata.create_all(self.engine)
+        patcher = mock.patch.object(MysqlProxy, "engine", self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nested_proxies_should_share_session_until_last_one_closed(self):
+        with MysqlProxy() as outer:
+            with MysqlProxy() as inner:
+                self.assertIs(inner.session, outer.session)
+                inner.insert(Test, {"name": "Ada", "age": 11})
+            self.assertTrue(session_registry.registry.has())
+            self.assertEqual(len(outer.select([Test], {})[1]), 1)
+        self.assertFalse(session_registry.registry.has())
+
+    def test_session_should_be_scoped_to_app_context_and_removed_at_teardown(self):
+        app = Flask(__name__)
+        app.teardown_appcontext(remove_session)
+        proxy = MysqlProxy()
+        with app.app_context():
+            proxy.connect()
+            with app.app_context():
+                self.assertIsNot(session_registry(), proxy.session)
+            self.assertIs(session_registry(), proxy.session)
+        with app.app_context():
+            self.assertFalse(session_registry.registry.has())
+        self.assertEqual(proxy.session.info.get("vulcanus_proxy_users"), 1)
+        proxy.close()
+
+    def test_failed_write_should_not_roll_back_work_of_other_proxy(self):
+        with MysqlProxy() as outer:
+            with MysqlProxy() as inner:
+                self.assertIs(inner.session, outer.session)
+                outer.session.add(Test(name="Ada", age=11))
+                self.assertFalse(inner.insert(Test, {"name": "Bob", "age": None}))
+                self.assertFalse(inner.insert_many(Test, [{"name": "Cid", "age": None}])[0])
+                self.assertTrue(inner.insert(Test, {"name": "Dan", "age": 13}))
+            self.assertEqual(sorted(row[0] for row in outer.select([Test.name], {})[1]), ["Ada", "Dan"])
+
+    def test_session_left_by_popped_context_should_not_be_reused(self):
+        app = Flask(__name__)
+        proxy = MysqlProxy()
+        with app.app_context():
+            proxy.connect()
+            proxy.insert(Test, {"name": "Ada", "age": 11})
+            stale = proxy.session
+        # the teardown isn't registered, the session is dropped with the context
+        self.assertNotIn(stale, session_registry.registry.registry.values())
+        with app.app_context():
+            with MysqlProxy() as other:
+                self.assertIsNot(other.session, stale)
+                self.assertNotIn("vulcanus_written", other.session.info)
+        proxy.close()
+
+    def test_reused_session_should_not_keep_info_of_previous_users(self):
+        session = session_registry()
+        self.addCleanup(session_registry.remove)
+        session.info.update({"vulcanus_written": True, "vulcanus_proxy_users": 0})
+        with MysqlProxy() as proxy:
+            self.assertIs(proxy.session, session)
+            self.assertEqual(session.info, {"vulcanus_proxy_users": 1})
+
+    def test_pool_checkout_should_be_counted(self):
+        metrics = get_pool_metrics(self.engine)
+        checkouts = metrics.checkouts
+        with MysqlProxy() as proxy:
+            self.assertEqual(metrics.checkouts, checkouts)
+            proxy.select([Test], {})
+            self.assertEqual(metrics.checked_out, 1)
+        self.assertEqual(metrics.checkouts, checkouts + 1)
+        self.assertEqual(metrics.checked_out, 0)
+
+
+class TestMysqlReplicaRouting(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.primary, self.replica, self.other_replica = [
+            create_database_engine("sqlite:///" + os.path.join(directory.name, name), 5, 7200)
+            for name in ("primary.db", "replica.db", "other_replica.db")
+        ]
+        for engine, name in ((self.primary, "primary"), (self.replica, "replica"), (self.other_replica, "other")):
+            Base.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(Test.__table__.insert(), [{"id": 1, "name": name, "age": 1}])
+            self.addCleanup(engine.dispose)
+        self.router = ReplicaRouter([self.replica])
+        for attr, value in (("engine", self.primary), ("replica_router", self.router)):
+            patcher = mock.patch.object(MysqlProxy, attr, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_select_should_read_replica_until_session_writes(self):
+        with MysqlProxy() as proxy:
+            self.assertEqual(proxy.select([Test.name], {})[1][0][0], "replica")
+            succeed, rows = proxy.select_iter([Test.name], {"id": 1})
+            self.assertEqual(list(rows), [("replica",)])
+            # queries on the session itself stay on the primary
+            self.assertEqual(proxy.session.query(Test.name).scalar(), "primary")
+            proxy.insert(Test, {"id": 2, "name": "new", "age": 2})
+            self.assertEqual(len(proxy.select([Test], {})[1]), 2)
+        with MysqlProxy() as proxy:
+            self.assertEqual(proxy.select([Test.name], {})[1][0][0], "replica")
+
+    def test_object_read_from_replica_should_be_flushed_to_primary(self):
+        with MysqlProxy() as proxy:
+            record = proxy.select([Test], {"id": 1})[1][0]
+            record.age = 30
+            proxy.session.commit()
+        with self.primary.connect() as connection:
+            self.assertEqual(connection.execute(Test.__table__.select()).first().age, 30)
+
+    def test_select_should_fall_back_to_primary_when_replica_lags(self):
+        lags = {self.replica: 10}
+        self.router.max_lag = 5
+        self.router.lag_probe = lags.get
+        with MysqlProxy() as proxy:
+            self.assertEqual(proxy.select([Test.name], {})[1][0][0], "primary")
+
+    def test_replica_lag_should_warn_once_in_a_while_when_status_unreadable(self):
+        # sqlite has no SHOW REPLICA STATUS, like a user without REPLICATION CLIENT
+        self.addCleanup(replica_router._lag_warnings.clear)
+        with mock.patch.object(replica_router, "LOGGER") as mock_logger, mock.patch.object(
+            replica_router.time, "monotonic"
+        ) as now:
+            now.return_value = 1000
+            self.assertIsNone(mysql_replica_lag(self.replica))
+            self.assertIsNone(mysql_replica_lag(self.replica))
+            self.assertIsNone(mysql_replica_lag(self.other_replica))
+            self.assertEqual(mock_logger.warning.call_count, 2)
+            now.return_value = 1000 + replica_router._LAG_WARNING_INTERVAL
+            self.assertIsNone(mysql_replica_lag(self.replica))
+            self.assertEqual(mock_logger.warning.call_count, 3)
+
+    def test_router_should_choose_replicas_by_strategy(self):
+        router = ReplicaRouter([self.replica, self.other_replica])
+        self.assertEqual([router.choose() for _ in range(3)], [self.replica, self.other_replica, self.replica])
+        router = ReplicaRouter([self.replica, self.other_replica], strategy="least_connections")
+        with self.replica.connect():
+            self.assertIs(router.choose(), self.other_replica)
+        lags = {self.replica: None, self.other_replica: 1}
+        router = ReplicaRouter([self.replica, self.other_replica], max_lag=5, lag_probe=lags.get)
+        self.assertEqual([router.choose() for _ in range(2)], [self.other_replica] * 2)
+
+    def test_router_should_not_wait_for_probe_of_other_thread(self):
+        probing, release = threading.Event(), threading.Event()
+
+        def lag_probe(engine):
+            if engine is self.replica:
+                probing.set()
+                release.wait(5)
+            return 0
+
+        router = ReplicaRouter([self.replica, self.other_replica], max_lag=5, lag_probe=lag_probe)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            slow = executor.submit(router.choose)
+            self.assertTrue(probing.wait(1))
+            # the lag of the replica being probed is unknown yet, the other one is probed meanwhile
+            self.assertIs(router.choose(), self.other_replica)
+            release.set()
+            self.assertIsNotNone(slow.result(1))
+
+    def test_router_should_rotate_replicas_evenly_across_threads(self):
+        router = ReplicaRouter([self.replica, self.other_replica])
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            chosen = list(executor.map(lambda _: router.choose(), range(400)))
+        self.assertEqual(chosen.count(self.replica), 200)
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import re
+import unittest
+from unittest import mock
+from urllib.parse import quote
+
+import numpy as np
+
+from vulcanus.database.proxy import PromDbProxy
+
+
+class FakePrometheusError(Exception):
+    pass
+
+
+def series(host, value=1):
+    return {"metric": {"instance": "%s:9100" % host}, "values": [[1700000000, str(value)]]}
+
+
+class PromDbTestCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("vulcanus.database.proxy.PrometheusConnect")
+        self.prom = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("vulcanus.database.proxy.PrometheusApiClientException", FakePrometheusError)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.prom.check_prometheus_connection.return_value = True
+        self.proxy = PromDbProxy(host="127.0.0.1", port=9090)
+
+
+class TestPromDbQueryMany(PromDbTestCase):
+    @staticmethod
+    def fake_range_data(metric_name, start_time, end_time):
+        hosts = re.findall(r"([\d.]+):\\\\d\{1,5\}", metric_name)
+        return [series(host) for host in hosts if host != "10.0.0.3"]
+
+    def test_query_many_should_query_once_per_metric_and_split_by_host(self):
+        self.prom.get_metric_range_data.side_effect = self.fake_range_data
+        hosts = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+        succeed, result = self.proxy.query_many(hosts, [1700000000, 1700000060], ["up", "node_load1"], {"job": "node"})
+
+        self.assertTrue(succeed)
+        self.assertEqual(self.prom.get_metric_range_data.call_count, 2)
+        selector = self.prom.get_metric_range_data.call_args_list[0][1]["metric_name"]
+        self.assertEqual(
+            selector, 'up{instance=~"10.0.0.1:\\\\d{1,5}|10.0.0.2:\\\\d{1,5}|10.0.0.3:\\\\d{1,5}",job="node"}'
+        )
+        self.assertEqual(result["10.0.0.1"]["up"], [series("10.0.0.1")])
+        self.assertEqual(result["10.0.0.2"]["node_load1"], [series("10.0.0.2")])
+        self.assertEqual(result["10.0.0.3"], {"up": [], "node_load1": []})
+
+    def test_query_many_should_split_hosts_when_query_too_long(self):
+        self.prom.get_metric_range_data.side_effect = self.fake_range_data
+        hosts = ["10.0.%d.%d" % (index // 256, index % 256) for index in range(200)]
+        with mock.patch.object(PromDbProxy, "MAX_QUERY_LENGTH", 1000), mock.patch(
+            "vulcanus.database.proxy.configuration.prometheus", None
+        ):
+            succeed, result = self.proxy.query_many(hosts, [1700000000, 1700000060], ["up"])
+
+        self.assertTrue(succeed)
+        calls = self.prom.get_metric_range_data.call_args_list
+        self.assertGreater(len(calls), 1)
+        queried = []
+        for call in calls:
+            self.assertLessEqual(len(quote(call[1]["metric_name"], safe="")), 1000)
+            queried.extend(re.findall(r"([\d.]+):\\\\d\{1,5\}", call[1]["metric_name"]))
+        self.assertEqual(queried, hosts)
+        self.assertEqual(result["10.0.0.3"]["up"], [])
+        self.assertTrue(all(result[host]["up"] == [series(host)] for host in hosts if host != "10.0.0.3"))
+
+    def test_query_many_should_mark_failed_queries_as_none(self):
+        def range_data(metric_name, start_time, end_time):
+            if metric_name.startswith("node_load1"):
+                raise FakePrometheusError("bad query")
+            return [series("10.0.0.1")]
+
+        self.prom.get_metric_range_data.side_effect = range_data
+        succeed, result = self.proxy.query_many(["10.0.0.1"], [1700000000, 1700000060], ["up", "node_load1"])
+
+        self.assertFalse(succeed)
+        self.assertEqual(result, {"10.0.0.1": {"up": [series("10.0.0.1")], "node_load1": None}})
+
+
+class TestPromDbColumnar(PromDbTestCase):
+    def test_to_columnar_should_parse_values_into_float_arrays(self):
+        data = [
+            {"metric": {"instance": "10.0.0.1:9100"}, "values": [[1700000000, "1.5"], [1700000015.5, "NaN"]]},
+            {"metric": {"instance": "10.0.0.2:9100"}, "values": [[1700000000, "+Inf"], [1700000015, "-Inf"]]},
+            {"metric": {"instance": "10.0.0.3:9100"}, "values": []},
+        ]
+        result = PromDbProxy.to_columnar(data)
+
+        self.assertEqual([series["metric"] for series in result], [series["metric"] for series in data])
+        self.assertEqual(result[0]["timestamps"].dtype, np.float64)
+        np.testing.assert_array_equal(result[0]["timestamps"], [1700000000, 1700000015.5])
+        np.testing.assert_array_equal(result[0]["values"], [1.5, np.nan])
+        np.testing.assert_array_equal(result[1]["values"], [np.inf, -np.inf])
+        self.assertTrue(result[1]["values"].flags["C_CONTIGUOUS"])
+        self.assertEqual(result[2]["timestamps"].shape, (0,))
+
+    def test_query_should_return_columnar_series_when_required(self):
+        self.prom.get_metric_range_data.return_value = [series("10.0.0.1", 3)]
+        succeed, data = self.proxy.query("10.0.0.1", [1700000000, 1700000060], "up", columnar=True)
+        self.assertTrue(succeed)
+        np.testing.assert_array_equal(data[0]["values"], [3.0])
+
+        succeed, result = self.proxy.query_many(["10.0.0.1"], [1700000000, 1700000060], ["up"], columnar=True)
+        self.assertTrue(succeed)
+        np.testing.assert_array_equal(result["10.0.0.1"]["up"][0]["timestamps"], [1700000000.0])
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from vulcanus.restful.client import AsyncHttpClient, HttpClient
+from vulcanus.restful.resp import state
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    attempts = {}
+
+    def do_GET(self):
+        status_code = 200
+        if self.path.startswith("/unavailable"):
+            status_code = 503
+        elif self.path.startswith("/flaky"):
+            StubHandler.attempts[self.path] = StubHandler.attempts.get(self.path, 0) + 1
+            status_code = 503 if StubHandler.attempts[self.path] < 2 else 200
+        body = json.dumps({"label": state.SUCCEED, "code": "200", "data": self.path}).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = "http://127.0.0.1:%s" % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_pooled_client_should_reuse_session(self):
+        client = HttpClient(pool_maxsize=2)
+        self.assertIs(client.session, client.session)
+        self.assertEqual(client.request("GET", self.url + "/hosts", timeout=5).json()["data"], "/hosts")
+        client.close()
+
+    @mock.patch.object(AsyncHttpClient, "WAIT_EXPONENTIAL_MAX", 0)
+    def test_request_all_should_keep_input_order_and_retry(self):
+        requests_params = [dict(method="GET", url=self.url + "/host/%s" % index) for index in range(20)]
+        requests_params.append(dict(method="GET", url=self.url + "/flaky/1"))
+        requests_params.append(dict(method="GET", url=self.url + "/unavailable"))
+        result = asyncio.run(AsyncHttpClient(concurrency=5, timeout=5).request_all(requests_params))
+
+        self.assertEqual([item["data"] for item in result[:20]], ["/host/%s" % index for index in range(20)])
+        self.assertEqual(result[20]["data"], "/flaky/1")
+        self.assertEqual(result[21]["label"], state.HTTP_CONNECT_ERROR)
+
+    @mock.patch.object(AsyncHttpClient, "WAIT_EXPONENTIAL_MAX", 0)
+    @mock.patch("vulcanus.restful.client.aiohttp", None)
+    def test_request_all_should_work_without_aiohttp(self):
+        requests_params = [dict(method="GET", url=self.url + "/host/%s" % index) for index in range(5)]
+        requests_params.append(dict(method="GET", url=self.url + "/flaky/2"))
+        requests_params.append(dict(method="GET", url=self.url + "/host", data=["wrong format"]))
+        result = asyncio.run(AsyncHttpClient(concurrency=2, timeout=5).request_all(requests_params))
+
+        self.assertEqual([item["data"] for item in result[:6]], ["/host/%s" % index for index in range(5)] + ["/flaky/2"])
+        self.assertEqual(result[6]["label"], state.PARAM_ERROR)
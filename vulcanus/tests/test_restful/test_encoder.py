@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import decimal
+import json
+import unittest
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+
+from vulcanus.restful.encoder import ResponseEncoder
+from vulcanus.restful.resp import make_response, state
+
+
+class TestResponseEncoder(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.body = make_response(
+            label=state.SUCCEED,
+            data={
+                "host_list": [{"host_id": 1, "host_name": "主机", "status": None}],
+                "last_scan": datetime(2024, 5, 20, 8, 30, 0),
+                "score": decimal.Decimal("9.8"),
+                "task_id": uuid.UUID("90d0a61e-32a8-11ee-8677-000c29766160"),
+                "total_count": 1,
+            },
+        )
+
+    def test_dumps_should_be_same_as_flask_jsonify(self):
+        with self.app.app_context():
+            expected = jsonify(self.body).get_json()
+        for backend in ResponseEncoder.BACKENDS:
+            encoder = ResponseEncoder(backend=backend)
+            self.assertEqual(json.loads(encoder.dumps(self.body)), expected)
+
+    def test_dumps_should_serialize_sqlalchemy_row_to_dict(self):
+        with create_engine("sqlite://").connect() as connection:
+            row = connection.execute(text("select 1 as host_id, 'host1' as host_name")).first()
+        encoder = ResponseEncoder()
+        self.assertEqual(json.loads(encoder.dumps([row])), [{"host_id": 1, "host_name": "host1"}])
+
+    def test_iter_encode_should_produce_response_body(self):
+        encoder = ResponseEncoder()
+        data = ({"host_id": index} for index in range(7))
+        body = json.loads(b"".join(encoder.iter_encode(state.SUCCEED, data=data, chunk_size=3)))
+        self.assertEqual(body["data"], [{"host_id": index} for index in range(7)])
+        self.assertEqual({key: body[key] for key in ("code", "label", "message")}, make_response(state.SUCCEED))
+
+        body = json.loads(b"".join(encoder.iter_encode(state.NO_DATA, message="empty", data=[])))
+        self.assertEqual(body["data"], [])
+        self.assertEqual(body["message"], "empty")
+
+    def test_dumps_should_encode_named_tuple_as_array_in_every_backend(self):
+        host = namedtuple("Host", ["host_id", "host_name"])(1, "host1")
+        with self.app.app_context():
+            expected = jsonify([host]).get_json()
+        self.assertEqual(expected, [[1, "host1"]])
+        for backend in ResponseEncoder.BACKENDS:
+            self.assertEqual(json.loads(ResponseEncoder(backend=backend).dumps([host])), expected)
+
+    def test_iter_encode_should_raise_value_error_when_label_unknown(self):
+        with self.assertRaises(ValueError):
+            next(ResponseEncoder().iter_encode("UnknownLabel"))
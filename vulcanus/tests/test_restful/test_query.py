@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import unittest
+
+from werkzeug.datastructures import MultiDict
+
+from vulcanus.restful.serialize.query import parse_query_args, parse_query_value
+
+
+class TestQueryParse(unittest.TestCase):
+    def test_parse_query_value_should_convert_list_and_dict(self):
+        self.assertEqual(parse_query_value('[1, 2]'), [1, 2])
+        self.assertEqual(parse_query_value("['host1', 'host2']"), ["host1", "host2"])
+        self.assertEqual(parse_query_value('{"status": ["done"]}'), {"status": ["done"]})
+        self.assertEqual(parse_query_value("%5B%22host1%22%5D"), ["host1"])
+        self.assertEqual(parse_query_value("%7b%22a%22%3A1%7d"), {"a": 1})
+
+    def test_parse_query_value_should_convert_python_literal(self):
+        self.assertEqual(
+            parse_query_value("{'a': None, 'b': [True, False], 'c': (1, -2.5), 'd': 'it\\'s\\n'}"),
+            {"a": None, "b": [True, False], "c": (1, -2.5), "d": "it's\n"},
+        )
+        self.assertEqual(parse_query_value("[(1,), (2), 'x',]"), [(1,), 2, "x"])
+
+    def test_parse_query_value_should_keep_string_when_not_container(self):
+        for value in ("", "host1", "[unclosed", "[not, a, literal]", "%5Bbroken%5D"):
+            self.assertEqual(parse_query_value(value), value)
+        for value in ("[__import__('os')]", "[1 2]", "[1,,2]", "{[1]: 2}", "['unterminated]", "[Truex]"):
+            self.assertEqual(parse_query_value(value), value)
+
+    def test_parse_query_value_should_keep_string_when_exceeds_limit(self):
+        deep_value = "[" * 17 + "]" * 17
+        self.assertEqual(parse_query_value(deep_value), deep_value)
+        self.assertEqual(parse_query_value("[" * 3 + "]" * 3), [[[]]])
+        long_value = "[" + ",".join(["1"] * 100) + "]"
+        self.assertEqual(parse_query_value(long_value, max_length=100), long_value)
+
+    def test_parse_query_args_should_convert_repeated_key_to_list(self):
+        args = MultiDict([("host_id", "1"), ("host_id", "2"), ("page", "1"), ("filter", '{"a": 1}')])
+        self.assertEqual(parse_query_args(args), {"host_id": ["1", "2"], "page": "1", "filter": {"a": 1}})
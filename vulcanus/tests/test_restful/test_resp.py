@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import unittest
+
+from vulcanus.restful.resp import Response, make_response, state
+
+
+class TestMakeResponse(unittest.TestCase):
+    def test_make_response_should_use_default_message_when_message_is_none(self):
+        self.assertEqual(
+            make_response(label=state.SUCCEED),
+            {"message": "operation succeed", "code": "200", "label": state.SUCCEED},
+        )
+
+    def test_make_response_should_keep_custom_message_and_data(self):
+        body = make_response(label=state.PARAM_ERROR, message="wrong host id", data=[1])
+        self.assertEqual(list(body), ["message", "data", "code", "label"])
+        self.assertEqual(body["message"], "wrong host id")
+        self.assertEqual(body["code"], "1000")
+
+    def test_make_response_should_raise_when_label_not_exists(self):
+        with self.assertRaises(ValueError):
+            make_response(label="Not.Exist.Label")
+
+    def test_table_should_keep_first_code_of_duplicate_label(self):
+        self.assertEqual(Response.xml.table[state.SERVER_ERROR].status_code, "500")
+        with self.assertRaises(TypeError):
+            Response.xml.table[state.SUCCEED] = None
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# ******************************************************************************
+# Copyright (c) Huawei Technologies Co., Ltd. 2021-2024. All rights reserved.
+# licensed under the Mulan PSL v2.
+# You can use this software according to the terms and conditions of the Mulan PSL v2.
+# You may obtain a copy of Mulan PSL v2 at:
+#     http://license.coscl.org.cn/MulanPSL2
+# THIS SOFTWARE IS PROVIDED ON AN 'AS IS' BASIS, WITHOUT WARRANTIES OF ANY KIND, EITHER EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT, MERCHANTABILITY OR FIT FOR A PARTICULAR
+# PURPOSE.
+# See the Mulan PSL v2 for more details.
+# ******************************************************************************/
+"""
+Time:
+Author:
+Description:
+"""
+import unittest
+from unittest import mock
+
+from vulcanus import rsa
+from vulcanus.rsa import (
+    canonical_bytes,
+    generate_rsa_key_pair,
+    get_public_key_pem_str,
+    load_cached_public_key,
+    recursive_sort,
+    sign_data,
+    verify_signature,
+    verify_signature_with_pem,
+)
+
+
+class TestRsa(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.private_key, public_key = generate_rsa_key_pair()
+        cls.public_pem = get_public_key_pem_str(public_key)
+        cls.data = {"host_list": [{"host_id": 2, "host_ip": "127.0.0.1"}], "cluster_id": "a7b1"}
+
+    def test_verify_signature_should_succeed_when_data_not_modified(self):
+        signature = sign_data(self.data, self.private_key)
+        self.assertTrue(verify_signature(self.data, signature, load_cached_public_key(self.public_pem)))
+
+    def test_load_cached_public_key_should_parse_pem_once(self):
+        with mock.patch.object(rsa, "load_public_key", wraps=rsa.load_public_key) as mock_load:
+            load_cached_public_key(self.public_pem, cluster_id="cluster-once")
+            load_cached_public_key(self.public_pem, cluster_id="cluster-once")
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_verify_signature_with_pem_should_fail_when_data_modified(self):
+        signature = sign_data(self.data, self.private_key)
+        self.assertTrue(verify_signature_with_pem(self.data, signature, self.public_pem, "a7b1"))
+        self.assertTrue(verify_signature_with_pem(self.data, signature, self.public_pem, "a7b1"))
+        self.assertFalse(verify_signature_with_pem(dict(self.data, cluster_id="c2d3"), signature, self.public_pem))
+
+    def test_canonical_bytes_should_be_same_as_earlier_format_when_compatible(self):
+        data = {
+            "b": [{"z": 1, "a": (3, {"y": 1, "x": 2})}, None, True, 1.5, "it's \"quoted\"\n", {2, 1}],
+            "a": {},
+            "c": [[], [{"d": 1, "c": [{}]}]],
+        }
+        for item in (data, self.data, [], {}, "text", 1):
+            self.assertEqual(canonical_bytes(item), str(recursive_sort(item)).encode())
+
+    def test_canonical_bytes_should_be_compact_json_when_not_compatible(self):
+        self.assertEqual(canonical_bytes({"b": [1, None], "a": "x"}, compatible=False), b'{"a":"x","b":[1,null]}')
+        signature = sign_data(self.data, self.private_key, compatible=False)
+        self.assertTrue(verify_signature_with_pem(self.data, signature, self.public_pem, compatible=False))
+        self.assertFalse(verify_signature_with_pem(self.data, signature, self.public_pem))
@@ -10,15 +10,28 @@
 # PURPOSE.
 # See the Mulan PSL v2 for more details.
 # ******************************************************************************/
+import hashlib
 import time
 from datetime import datetime, timedelta
 
 import jwt
 from jwt.exceptions import ExpiredSignatureError
+from redis.exceptions import RedisError
 
 from vulcanus.conf import configuration
+from vulcanus.local_cache import InvalidationListener, LocalCache
+from vulcanus.log.log import LOGGER
 
-__all__ = ["generate_token", "decode_token", "get_timedelta"]
+__all__ = [
+    "generate_token",
+    "decode_token",
+    "get_timedelta",
+    "VerifiedTokenCache",
+    "verified_token_cache",
+    "publish_token_invalidation",
+]
+
+TOKEN_INVALIDATE_CHANNEL = "token-invalidate"
 
 
 def get_timedelta(minutes: int = 20) -> int:
@@ -91,3 +104,113 @@ def decode_token(token):
         raise ExpiredSignatureError("Signature has expired")
     except Exception:
         raise ValueError("It is not a valid token")
+
+
+def token_cache_key(username, aud):
+    """
+    Redis key of the token issued to the user for the client
+    """
+    return "token-" + username + "-" + aud
+
+
+class VerifiedTokenCache:
+    """
+    Remember the tokens verified against redis for a short revalidation window, so the following
+    requests carrying the same token skip the jwt decode and the redis query. An entry never outlives
+    the exp of its token, and it is dropped as soon as the token key in redis is rewritten, deleted or
+    expired, which is notified by the keyspace events of redis or by publish_token_invalidation.
+    """
+
+    KEYSPACE_PATTERN = "__keyspace@*__:token-*"
+
+    def __init__(self, maxsize=None, revalidate_window=None):
+        """
+        Args:
+            maxsize(int): maximum number of cached tokens
+            revalidate_window(int): seconds that a verified token is trusted, 0 disables the cache
+        """
+        token_config = configuration.token_cache
+        if revalidate_window is None:
+            revalidate_window = getattr(token_config, "revalidate_window", None)
+        self.revalidate_window = 30 if revalidate_window is None else revalidate_window
+        self._cache = LocalCache(maxsize=maxsize or getattr(token_config, "max_size", None) or 10000)
+        self._listener = InvalidationListener(
+            TOKEN_INVALIDATE_CHANNEL, (self.KEYSPACE_PATTERN,), self.invalidate, self.clear
+        )
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token):
+        """
+        Get the claims of a verified token
+
+        Args:
+            token(str)
+
+        Returns:
+            dict/None: claims of the token, None when the token should be verified again
+        """
+        if not self.revalidate_window:
+            return None
+        return self._cache.get(self._digest(token))
+
+    def set(self, token, verify_info, redis_client):
+        """
+        Remember a token verified against redis
+
+        Args:
+            token(str)
+            verify_info(dict): claims of the token
+            redis_client(Redis): client used to listen to the invalidation of the token
+        """
+        if not self.revalidate_window:
+            return
+        ttl = self.revalidate_window
+        if verify_info.get("exp"):
+            ttl = min(ttl, verify_info["exp"] - time.time())
+        if ttl <= 0 or not self._ensure_listener(redis_client):
+            return
+        claims = dict(sub=verify_info["sub"], aud=verify_info.get("aud"))
+        claims["key"] = token_cache_key(claims["sub"], claims["aud"] or "")
+        self._cache.set(self._digest(token), claims, ttl)
+
+    def invalidate(self, key):
+        """
+        Drop the cached tokens stored in redis with the key
+
+        Args:
+            key(str): redis key of the token, e.g token-admin-vulcanus
+        """
+        self._cache.remove_if(lambda claims: claims["key"] == key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def _ensure_listener(self, redis_client):
+        return self._listener.ensure_started(redis_client)
+
+    def _on_message(self, message):
+        self._listener.on_message(message)
+
+
+verified_token_cache = VerifiedTokenCache()
+
+
+def publish_token_invalidation(redis_client, username, aud):
+    """
+    Notify all the processes to drop the cached token of the user, it should be called after the
+    token is deleted or replaced, e.g logout or refresh token
+
+    Args:
+        redis_client(Redis)
+        username(str)
+        aud(str): client id of the token
+    """
+    key = token_cache_key(username, aud)
+    verified_token_cache.invalidate(key)
+    try:
+        redis_client.publish(TOKEN_INVALIDATE_CHANNEL, key)
+    except RedisError as error:
+        LOGGER.error(error)